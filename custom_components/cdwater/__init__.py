@@ -1,12 +1,16 @@
 """成都自来水集成插件"""
 
 import logging
+import os
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.const import Platform
+from homeassistant.helpers.storage import Store
 
-from .const import DOMAIN
-from .coordinator import CdwaterDataUpdateCoordinator
+from .const import DOMAIN, DATA_HUB, CONF_USER_ID, STORAGE_VERSION
+from .coordinator import CdwaterDataUpdateCoordinator, history_path, storage_key
+from .hub import async_get_hub
+from .services import async_setup_services
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,10 +19,31 @@ PLATFORMS = [Platform.SENSOR]
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """设置集成入口"""
-    hass.data.setdefault(DOMAIN, {})
-
-    coordinator = CdwaterDataUpdateCoordinator(hass, entry)
-    await coordinator.async_config_entry_first_refresh()
+    hub = async_get_hub(hass)
+    hub.register(entry.entry_id)
+    async_setup_services(hass)
+
+    coordinator = CdwaterDataUpdateCoordinator(hass, entry, hub)
+
+    if await coordinator.async_restore_data():
+        # 先用缓存数据创建实体，网络刷新放到后台
+        if coordinator.restored_data_is_stale:
+            entry.async_create_background_task(
+                hass,
+                coordinator.async_refresh(),
+                f"{DOMAIN}_{entry.entry_id}_refresh",
+            )
+    else:
+        # 首次安装没有缓存，需要等待第一次刷新
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except Exception:
+            await coordinator.async_shutdown()
+            # 与卸载一致：没有其他配置条目时关闭共享连接池
+            if hub.unregister(entry.entry_id):
+                hass.data[DOMAIN].pop(DATA_HUB)
+                await hub.async_close()
+            raise
 
     hass.data[DOMAIN][entry.entry_id] = coordinator
 
@@ -41,6 +66,26 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
 
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_shutdown()
+
+        # 最后一个配置条目卸载后关闭共享连接池
+        if coordinator.hub.unregister(entry.entry_id):
+            hub = hass.data[DOMAIN].pop(DATA_HUB)
+            await hub.async_close()
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """删除集成时清理缓存数据和账单历史"""
+    await Store(hass, STORAGE_VERSION, storage_key(entry.entry_id)).async_remove()
+
+    path = history_path(hass, entry.data[CONF_USER_ID])
+
+    def remove_history():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    await hass.async_add_executor_job(remove_history)
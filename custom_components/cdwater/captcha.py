@@ -1,240 +1,28 @@
 """验证码识别器"""
 
+import asyncio
+import importlib
 import os
 import logging
 import hashlib
 import base64
 import uuid
-from typing import Tuple, Optional
-from PIL import Image
-import numpy as np
+from typing import Dict, List, Tuple, Optional, Union
 import aiohttp
-import io
 
 # 验证码识别方式常量
 CAPTCHA_METHOD_NCC = "ncc"
 CAPTCHA_METHOD_CHAOJIYING = "chaojiying"
+CAPTCHA_METHOD_REMOTE_NCC = "remote_ncc"
 
 # 超级鹰配置
 CHAOJIYING_API_URL = "https://upload.chaojiying.net/Upload/Processing.php"
 CHAOJIYING_CODETYPE = "6001"  # 计算题，他比俩个汉字的单价便宜(计算题15，汉字是20)，测试了一次发现也可以识别
 
-_LOGGER = logging.getLogger(__name__)
-
-
-class NCCCaptchaRecognizer:
-    """基于NCC算法的验证码识别器"""
-
-    def __init__(self):
-        """初始化NCC识别器"""
-        self._templates = {}
-        self._templates_dir = os.path.join(os.path.dirname(__file__), "templates")
-        self._confidence_threshold = 0.35
-        self._templates_loaded = False
-
-    async def _load_templates(self):
-        """加载模板文件"""
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
-
-        if not os.path.exists(self._templates_dir):
-            _LOGGER.warning(f"模板目录不存在: {self._templates_dir}")
-            return
-
-        def load_single_template(filename):
-            """加载单个模板文件"""
-            if not filename.endswith(".png"):
-                return None
-
-            # 模板文件名格式: char_name_uuid.png
-            parts = os.path.splitext(filename)[0].split("_")
-            if len(parts) < 2:
-                return None
-
-            char_name = parts[0]
-            template_path = os.path.join(self._templates_dir, filename)
-            try:
-                with open(template_path, "rb") as f:
-                    img = Image.open(f)
-                    img.load()  # 确保图片数据被加载
-                    template_binary = self._get_binary_image(img)
-                    if template_binary is not None:
-                        return (char_name, template_binary)
-            except Exception as e:
-                _LOGGER.warning(f"无法加载模板文件 {template_path}: {e}")
-            return None
-
-        # 获取所有模板文件
-        def list_template_files():
-            """在线程中列出模板文件"""
-            try:
-                return os.listdir(self._templates_dir)
-            except OSError as e:
-                _LOGGER.error(f"无法读取模板目录 {self._templates_dir}: {e}")
-                return []
-
-        loop = asyncio.get_event_loop()
-        filenames = await loop.run_in_executor(None, list_template_files)
-
-        # 使用线程池异步加载模板
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            tasks = [
-                loop.run_in_executor(executor, load_single_template, filename)
-                for filename in filenames
-            ]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 处理结果
-        template_count = 0
-        for result in results:
-            if isinstance(result, Exception):
-                _LOGGER.warning(f"加载模板时出现异常: {result}")
-                continue
-            if result is not None:
-                char_name, template_binary = result
-                if char_name not in self._templates:
-                    self._templates[char_name] = []
-                self._templates[char_name].append(template_binary)
-                template_count += 1
-
-        _LOGGER.info(
-            f"加载了 {template_count} 个模板，覆盖 {len(self._templates)} 个字符"
-        )
-
-    def _get_binary_image(self, pil_image, threshold=127):
-        """将PIL图片转换为二值化numpy数组"""
-        img_gray = pil_image.convert("L")
-        img_array = np.array(img_gray)
-        binary_img = (img_array < threshold).astype(np.uint8)
-        return binary_img
-
-    def _normalized_cross_correlation(self, template, image):
-        """使用 numpy 实现 NCC 算法"""
-        try:
-            # 统一模板和图像尺寸
-            resized_image = np.array(
-                Image.fromarray(image * 255).resize(template.shape[::-1], Image.LANCZOS)
-            )
-            resized_image = (resized_image < 127).astype(np.uint8)
-
-            T = template.astype(float)
-            I = resized_image.astype(float)
-            T_centered = T - np.mean(T)
-            I_centered = I - np.mean(I)
-            numerator = np.sum(T_centered * I_centered)
-            denominator = np.sqrt(np.sum(T_centered**2) * np.sum(I_centered**2))
-            if denominator == 0:
-                return 0
-            return numerator / denominator
-        except Exception:
-            return 0
-
-    def _segment_by_center(self, binary_img):
-        """使用图片中线进行分割"""
-        height, width = binary_img.shape
-        mid_point = width // 2
-
-        char1_img = binary_img[:, :mid_point]
-        char2_img = binary_img[:, mid_point:]
-
-        # 简单检查分割后的区域是否包含字符像素
-        if np.sum(char1_img) == 0 or np.sum(char2_img) == 0:
-            return []
-
-        # 找到每个分割区域的精确边界框
-        def get_bbox(segment):
-            coords = np.argwhere(segment > 0)
-            if coords.size == 0:
-                return None
-            y1, x1 = coords.min(axis=0)
-            y2, x2 = coords.max(axis=0)
-            return (x1, y1, x2, y2)
-
-        box1 = get_bbox(char1_img)
-        box2 = get_bbox(char2_img)
-
-        if box1 and box2:
-            return [
-                (box1[0], box1[1], box1[2], box1[3]),
-                (box2[0] + mid_point, box2[1], box2[2] + mid_point, box2[3]),
-            ]
-
-        return []
-
-    def _extract_char_images(self, binary_img, bboxes):
-        """根据边界框提取单个字符图像"""
-        char_images = []
-        for x1, y1, x2, y2 in bboxes:
-            char_img = binary_img[y1 : y2 + 1, x1 : x2 + 1]
-            char_images.append(char_img)
-        return char_images
-
-    async def recognize(self, image_data: bytes) -> Tuple[str, float]:
-        """识别验证码
-
-        Args:
-            image_data: 验证码图片的二进制数据
-
-        Returns:
-            (识别结果, 平均置信度)
-        """
-        # 确保模板已加载
-        if not self._templates_loaded:
-            await self._load_templates()
-            self._templates_loaded = True
-
-        if not self._templates:
-            raise RuntimeError("没有可用的模板文件")
-
-        try:
-            # 加载图片
-            img = Image.open(io.BytesIO(image_data))
-            binary_img = self._get_binary_image(img)
+# NCC 模板目录
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
 
-            # 分割字符
-            bboxes = self._segment_by_center(binary_img)
-            if len(bboxes) != 2:
-                raise RuntimeError("无法正确分割验证码图片")
-
-            char_images = self._extract_char_images(binary_img, bboxes)
-
-            # 识别每个字符
-            recognized_text = ""
-            confidences = []
-
-            for char_img in char_images:
-                best_match = ""
-                max_score = -1.0
-
-                for char_name, template_list in self._templates.items():
-                    for template in template_list:
-                        score = self._normalized_cross_correlation(template, char_img)
-                        if score > max_score:
-                            max_score = score
-                            best_match = char_name
-
-                confidences.append(max_score)
-                recognized_text += best_match
-
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-
-            _LOGGER.debug(
-                f"NCC识别结果: {recognized_text}, 置信度: {confidences}, 平均: {avg_confidence:.3f}"
-            )
-
-            return recognized_text, avg_confidence
-
-        except Exception as e:
-            _LOGGER.error(f"NCC验证码识别失败: {e}")
-            raise
-
-    def is_available(self) -> bool:
-        """检查识别器是否可用"""
-        # 如果模板还没加载，简单检查模板目录是否存在
-        if not self._templates_loaded:
-            return os.path.exists(self._templates_dir)
-        return len(self._templates) > 0
+_LOGGER = logging.getLogger(__name__)
 
 
 class ChaoJiYingCaptchaRecognizer:
@@ -300,11 +88,105 @@ class ChaoJiYingCaptchaRecognizer:
             _LOGGER.error(f"超级鹰验证码识别失败: {e}")
             raise
 
+    async def recognize_many(
+        self, images: List[bytes]
+    ) -> List[Union[Tuple[str, float], Exception]]:
+        """批量识别验证码，每张图片一次 API 调用，同时进行
+
+        Returns:
+            与 images 一一对应的 (识别结果, 置信度)，失败的位置为异常
+        """
+        return await asyncio.gather(
+            *(self.recognize(image_data) for image_data in images),
+            return_exceptions=True,
+        )
+
     def is_available(self) -> bool:
         """检查识别器是否可用"""
         return bool(self.username and self.password and self.soft_id)
 
 
+class RemoteNCCCaptchaRecognizer:
+    """调用 captcha_service 服务的 NCC 识别器
+
+    多个 Home Assistant 实例和批量任务可以共用同一个服务，模板只在服务端加载一次。
+    """
+
+    def __init__(self, url: str):
+        """初始化远程识别器
+
+        Args:
+            url: 识别服务地址，如 http://192.168.1.10:8090
+        """
+        self.url = url.rstrip("/")
+
+    async def recognize(self, image_data: bytes) -> Tuple[str, float]:
+        """识别验证码
+
+        Args:
+            image_data: 验证码图片的二进制数据
+
+        Returns:
+            (识别结果, 置信度)
+        """
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    f"{self.url}/recognize",
+                    data=image_data,
+                    headers={"Content-Type": "application/octet-stream"},
+                    timeout=aiohttp.ClientTimeout(total=10),
+                ) as response:
+                    result = await response.json()
+                    if response.status != 200:
+                        raise RuntimeError(result.get("error", f"HTTP {response.status}"))
+                    return result["text"], result["confidence"]
+        except Exception as e:
+            _LOGGER.error(f"远程NCC验证码识别失败: {e}")
+            raise
+
+    async def recognize_many(
+        self, images: List[bytes]
+    ) -> List[Union[Tuple[str, float], Exception]]:
+        """批量识别验证码，全部图片放在一个 multipart 请求中
+
+        Returns:
+            与 images 一一对应的 (识别结果, 置信度)，失败的位置为异常
+        """
+        if not images:
+            return []
+
+        with aiohttp.MultipartWriter("form-data") as writer:
+            for index, image_data in enumerate(images):
+                part = writer.append(image_data, {"Content-Type": "application/octet-stream"})
+                part.set_content_disposition("form-data", name="image", filename=f"{index}.png")
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    f"{self.url}/recognize_many",
+                    data=writer,
+                    timeout=aiohttp.ClientTimeout(total=30),
+                ) as response:
+                    result = await response.json()
+                    if response.status != 200:
+                        raise RuntimeError(result.get("error", f"HTTP {response.status}"))
+        except Exception as e:
+            _LOGGER.error(f"远程NCC批量识别失败: {e}")
+            raise
+
+        return [
+            (item["text"], item["confidence"])
+            if "error" not in item
+            else RuntimeError(item["error"])
+            for item in result["results"]
+        ]
+
+    def is_available(self) -> bool:
+        """检查识别器是否可用"""
+        return bool(self.url)
+
+
 class CaptchaRecognizer:
     """验证码识别器统一接口"""
 
@@ -312,14 +194,18 @@ class CaptchaRecognizer:
         """初始化识别器
 
         Args:
-            method: 识别方法 (ncc 或 chaojiying)
+            method: 识别方法 (ncc、chaojiying 或 remote_ncc)
             **kwargs: 其他参数
         """
         self.method = method
         self._recognizer = None
+        self._ncc_options = {}
 
         if method == CAPTCHA_METHOD_NCC:
-            self._recognizer = NCCCaptchaRecognizer()
+            # NCC 依赖 numpy 和 Pillow，预热或首次识别时才在线程中导入
+            self._ncc_options = {
+                key: kwargs[key] for key in ("adaptive_threshold", "despeckle") if key in kwargs
+            }
         elif method == CAPTCHA_METHOD_CHAOJIYING:
             username = kwargs.get("username")
             password = kwargs.get("password")
@@ -327,6 +213,11 @@ class CaptchaRecognizer:
             if not all([username, password, soft_id]):
                 raise ValueError("超级鹰识别器需要提供 username, password, soft_id")
             self._recognizer = ChaoJiYingCaptchaRecognizer(username, password, soft_id)
+        elif method == CAPTCHA_METHOD_REMOTE_NCC:
+            url = kwargs.get("url")
+            if not url:
+                raise ValueError("远程NCC识别器需要提供 url")
+            self._recognizer = RemoteNCCCaptchaRecognizer(url)
         else:
             raise ValueError(f"不支持的识别方法: {method}")
 
@@ -339,15 +230,62 @@ class CaptchaRecognizer:
         Returns:
             (识别结果, 置信度)
         """
-        if not self._recognizer:
+        await self._async_ensure_backend()
+        return await self._recognizer.recognize(image_data)
+
+    async def recognize_many(
+        self, images: List[bytes]
+    ) -> List[Union[Tuple[str, float], Exception]]:
+        """批量识别验证码
+
+        单张失败不影响其他图片，失败的位置返回异常而不是抛出。
+
+        Args:
+            images: 验证码图片的二进制数据列表
+
+        Returns:
+            与 images 一一对应的 (识别结果, 置信度) 或异常
+        """
+        await self._async_ensure_backend()
+        return await self._recognizer.recognize_many(images)
+
+    async def _async_ensure_backend(self):
+        """按需创建 NCC 识别器，模块导入放在线程中，不阻塞事件循环"""
+        if self._recognizer is not None:
+            return
+        if self.method != CAPTCHA_METHOD_NCC:
             raise RuntimeError("识别器未初始化")
 
-        return await self._recognizer.recognize(image_data)
+        loop = asyncio.get_running_loop()
+        ncc = await loop.run_in_executor(None, importlib.import_module, f"{__package__}.ncc")
+        if self._recognizer is None:
+            self._recognizer = ncc.NCCCaptchaRecognizer(**self._ncc_options)
+
+    async def async_warm_up(self):
+        """预先加载识别器需要的资源（只有 NCC 需要）"""
+        await self._async_ensure_backend()
+        warm_up = getattr(self._recognizer, "async_warm_up", None)
+        if warm_up is not None:
+            await warm_up()
 
     def is_available(self) -> bool:
         """检查识别器是否可用"""
-        return self._recognizer and self._recognizer.is_available()
+        if self._recognizer is None:
+            # NCC 尚未加载时只检查模板目录是否存在
+            return self.method == CAPTCHA_METHOD_NCC and os.path.exists(TEMPLATES_DIR)
+        return self._recognizer.is_available()
 
     def get_method(self) -> str:
         """获取识别方法"""
         return self.method
+
+    def stats(self) -> Dict:
+        """识别器统计（NCC 包含模板库信息）"""
+        stats = {"method": self.method}
+        if self._recognizer is None:
+            stats["templates_loaded"] = False
+            return stats
+        backend_stats = getattr(self._recognizer, "stats", None)
+        if backend_stats is not None:
+            stats.update(backend_stats())
+        return stats
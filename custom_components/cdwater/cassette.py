@@ -0,0 +1,213 @@
+"""HTTP 交互的录制与回放
+
+CdwaterClient 通过传输层发出三类请求：访问查询页面、下载验证码和提交查询。
+录制传输把每次交互（状态码、验证码图片、查询参数、响应文本、网络异常）
+记到 Cassette 中，保存为 gzip 压缩的 JSON 文件；回放传输按顺序把这些
+交互原样返回，不访问网络也不等待，解析、识别和重试逻辑可以在真实数据上
+确定地重复运行。
+
+录制文件包含用户号，分享前请注意。
+"""
+
+import asyncio
+import base64
+import gzip
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import aiohttp
+
+CASSETTE_VERSION = 1
+
+# 请求类型
+KIND_VISIT = "visit"
+KIND_CAPTCHA = "captcha"
+KIND_QUERY = "query"
+
+# 录制的异常类型
+ERROR_TIMEOUT = "timeout"
+ERROR_CLIENT = "client"
+
+
+@dataclass
+class Exchange:
+    """一次 HTTP 交互"""
+
+    kind: str
+    status: int = 0
+    params: Optional[Dict[str, str]] = None
+    content: Optional[bytes] = None
+    text: Optional[str] = None
+    # 网络异常：(类型, 说明)
+    error: Optional[List[str]] = None
+
+    def as_dict(self) -> Dict:
+        """转换为可序列化的字典，省略空字段"""
+        data = {"kind": self.kind, "status": self.status}
+        if self.params:
+            data["params"] = self.params
+        if self.content is not None:
+            data["content"] = base64.b64encode(self.content).decode("ascii")
+        if self.text is not None:
+            data["text"] = self.text
+        if self.error:
+            data["error"] = self.error
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Exchange":
+        """从字典恢复"""
+        content = data.get("content")
+        return cls(
+            kind=data["kind"],
+            status=data.get("status", 0),
+            params=data.get("params"),
+            content=base64.b64decode(content) if content is not None else None,
+            text=data.get("text"),
+            error=data.get("error"),
+        )
+
+
+@dataclass
+class Cassette:
+    """按顺序保存的一组交互"""
+
+    exchanges: List[Exchange] = field(default_factory=list)
+    recorded_at: float = field(default_factory=time.time)
+
+    def save(self, path: str):
+        """保存为 gzip 压缩的 JSON 文件（阻塞）"""
+        payload = {
+            "version": CASSETTE_VERSION,
+            "recorded_at": self.recorded_at,
+            "exchanges": [exchange.as_dict() for exchange in self.exchanges],
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as file:
+            json.dump(payload, file, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        """读取录制文件（阻塞）"""
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            payload = json.load(file)
+        if payload.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"不支持的录制文件版本: {payload.get('version')}")
+        return cls(
+            exchanges=[Exchange.from_dict(item) for item in payload["exchanges"]],
+            recorded_at=payload.get("recorded_at", 0.0),
+        )
+
+
+class AiohttpTransport:
+    """通过 aiohttp 会话访问网站"""
+
+    def __init__(self, session: aiohttp.ClientSession):
+        """初始化
+
+        Args:
+            session: 已创建的会话，由调用方负责关闭
+        """
+        self._session = session
+
+    async def request(
+        self,
+        kind: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Exchange:
+        """发出请求；只读取该类请求需要的响应内容"""
+        async with self._session.get(url, params=params, headers=headers) as response:
+            exchange = Exchange(kind, response.status, params)
+            if response.status == 200:
+                if kind == KIND_CAPTCHA:
+                    exchange.content = await response.read()
+                elif kind == KIND_QUERY:
+                    exchange.text = await response.text()
+            return exchange
+
+
+class RecordingTransport:
+    """把经过的交互记录到 Cassette 中"""
+
+    def __init__(self, inner, cassette: Cassette):
+        """初始化
+
+        Args:
+            inner: 实际发出请求的传输层
+            cassette: 记录目标
+        """
+        self._inner = inner
+        self.cassette = cassette
+
+    async def request(
+        self,
+        kind: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Exchange:
+        """转发请求并记录结果，网络异常也会被记录"""
+        try:
+            exchange = await self._inner.request(kind, url, params, headers)
+        except asyncio.TimeoutError as err:
+            self.cassette.exchanges.append(
+                Exchange(kind, params=params, error=[ERROR_TIMEOUT, str(err)])
+            )
+            raise
+        except aiohttp.ClientError as err:
+            self.cassette.exchanges.append(
+                Exchange(kind, params=params, error=[ERROR_CLIENT, f"{type(err).__name__}: {err}"])
+            )
+            raise
+        self.cassette.exchanges.append(exchange)
+        return exchange
+
+
+class ReplayTransport:
+    """按顺序回放 Cassette 中的交互"""
+
+    def __init__(self, cassette: Cassette, loop: bool = False):
+        """初始化
+
+        Args:
+            cassette: 要回放的录制内容
+            loop: 回放完后是否从头开始，便于重复运行基准测试
+        """
+        self._exchanges = cassette.exchanges
+        self._loop = loop
+        self._position = 0
+
+    @property
+    def remaining(self) -> int:
+        """尚未回放的交互数"""
+        return len(self._exchanges) - self._position
+
+    async def request(
+        self,
+        kind: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Exchange:
+        """返回下一条录制的交互，类型必须与请求一致"""
+        if self._position >= len(self._exchanges):
+            if not self._loop or not self._exchanges:
+                raise aiohttp.ClientError("录制的交互已回放完")
+            self._position = 0
+
+        exchange = self._exchanges[self._position]
+        self._position += 1
+        if exchange.kind != kind:
+            raise aiohttp.ClientError(
+                f"回放顺序不一致：期望 {kind}，录制的是 {exchange.kind}"
+            )
+
+        if exchange.error:
+            error_type, message = exchange.error
+            if error_type == ERROR_TIMEOUT:
+                raise asyncio.TimeoutError(message)
+            raise aiohttp.ClientError(message)
+        return exchange
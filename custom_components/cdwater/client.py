@@ -1,13 +1,33 @@
 """成都自来水API客户端"""
 
+import asyncio
 import logging
 import random
-import re
-from typing import Dict, List, Optional
-from urllib.parse import quote
-from html.parser import HTMLParser
+from typing import Dict, Optional, Type
+from urllib.parse import urlsplit
 import aiohttp
 
+from .cassette import (
+    Cassette,
+    AiohttpTransport,
+    RecordingTransport,
+    KIND_VISIT,
+    KIND_CAPTCHA,
+    KIND_QUERY,
+)
+from .exceptions import CdwaterError, CaptchaError, NetworkError, ServerError
+from .metrics import (
+    FetchTimeline,
+    stage_span,
+    STAGE_VISIT,
+    STAGE_CAPTCHA_DOWNLOAD,
+    STAGE_RECOGNIZE,
+    STAGE_SUBMIT,
+    STAGE_PARSE,
+)
+from .parser import parse_response
+from .retry import RetryPolicy, RetryScheduler
+
 _LOGGER = logging.getLogger(__name__)
 
 # API URLs
@@ -32,400 +52,214 @@ DEFAULT_HEADERS = {
 }
 
 
-class CdwaterHTMLParser(HTMLParser):
-    """简化的HTML解析器"""
-
-    def __init__(self):
-        super().__init__()
-        self.tables = []
-        self.current_table = None
-        self.current_row = None
-        self.in_table = False
-        self.in_row = False
-        self.in_cell = False
-        self.cell_text = ""
-
-    def handle_starttag(self, tag, attrs):
-        if tag == "table":
-            self.in_table = True
-            self.current_table = []
-        elif tag == "tr" and self.in_table:
-            self.in_row = True
-            self.current_row = []
-        elif tag in ["td", "th"] and self.in_row:
-            self.in_cell = True
-            self.cell_text = ""
-
-    def handle_endtag(self, tag):
-        if tag == "table" and self.in_table:
-            if self.current_table:
-                self.tables.append(self.current_table)
-            self.in_table = False
-            self.current_table = None
-        elif tag == "tr" and self.in_row:
-            if self.current_row:
-                self.current_table.append(self.current_row)
-            self.in_row = False
-            self.current_row = None
-        elif tag in ["td", "th"] and self.in_cell:
-            self.current_row.append(self.cell_text.strip())
-            self.in_cell = False
-            self.cell_text = ""
-
-    def handle_data(self, data):
-        if self.in_cell:
-            self.cell_text += data
-
-
 class CdwaterClient:
     """成都自来水客户端"""
 
-    def __init__(self, captcha_recognizer=None, max_retries=3):
+    def __init__(
+        self,
+        captcha_recognizer=None,
+        max_retries=3,
+        retry_policies: Optional[Dict[Type[CdwaterError], RetryPolicy]] = None,
+        connector: Optional[aiohttp.BaseConnector] = None,
+        base_url: str = BASE_URL,
+        transport=None,
+        cassette: Optional[Cassette] = None,
+    ):
         """初始化客户端
 
         Args:
             captcha_recognizer: 验证码识别器，如果不提供则需要外部处理验证码
-            max_retries: 最大重试次数
+            max_retries: 最大尝试次数
+            retry_policies: 按错误类型的重试策略，默认使用 DEFAULT_RETRY_POLICIES
+            connector: 共享的连接池，不提供时会话自己创建并在退出时关闭
+            base_url: 网站地址，离线测试时指向本地模拟服务器
+            transport: 自定义传输层（如 ReplayTransport），提供时不创建会话
+            cassette: 提供时把每次 HTTP 交互录制到其中
         """
         self._session = None
+        self._transport = transport
+        self._cassette = cassette
         self._captcha_recognizer = captcha_recognizer
         self._max_retries = max_retries
+        self._retry_policies = retry_policies
+        self._connector = connector
+        base_url = base_url.rstrip("/")
+        self._waterbill_url = f"{base_url}/htm/waterbill.html"
+        self._record_url_template = f"{base_url}/record_{{random_value}}.html"
+        self._api_url_template = f"{base_url}/htm/getdbsign_{{random_value}}.html"
+        self._headers = dict(DEFAULT_HEADERS, Host=urlsplit(base_url).netloc)
 
     async def __aenter__(self):
         """异步上下文管理器入口"""
-        self._session = aiohttp.ClientSession(
-            headers=DEFAULT_HEADERS, timeout=aiohttp.ClientTimeout(total=30)
-        )
+        if self._transport is None:
+            # 每次查询使用独立的会话（cookie），连接池可以共享
+            self._session = aiohttp.ClientSession(
+                connector=self._connector,
+                connector_owner=self._connector is None,
+                headers=self._headers,
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+            self._transport = AiohttpTransport(self._session)
+        if self._cassette is not None:
+            self._transport = RecordingTransport(self._transport, self._cassette)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """异步上下文管理器出口"""
         if self._session:
             await self._session.close()
-
-    async def get_water_bill_data(self, user_id: str) -> Dict:
+            self._session = None
+            self._transport = None
+
+    async def get_water_bill_data(
+        self,
+        user_id: str,
+        timeline: Optional[FetchTimeline] = None,
+        watermarks: Optional[Dict[str, str]] = None,
+    ) -> Dict:
         """获取水费账单数据
 
         Args:
             user_id: 用户号
+            timeline: 可选的耗时记录，为 None 时不计时
+            watermarks: 已知最新账期，给出时只返回新账期（见 parse_tables）
 
         Returns:
             解析后的账单数据
+
+        Raises:
+            CdwaterError: 按重试策略重试后仍然失败
         """
-        if not self._session:
+        if not self._transport:
             raise RuntimeError("客户端未初始化")
 
-        last_error = None
+        scheduler = RetryScheduler(self._max_retries, self._retry_policies)
+        return await scheduler.run(
+            lambda attempt: self._fetch_once(user_id, attempt, timeline, watermarks)
+        )
 
-        # 重试机制
-        for attempt in range(self._max_retries):
-            try:
-                _LOGGER.debug(f"开始第 {attempt + 1} 次尝试获取水费数据")
+    async def _fetch_once(
+        self,
+        user_id: str,
+        attempt: int,
+        timeline: Optional[FetchTimeline],
+        watermarks: Optional[Dict[str, str]],
+    ) -> Dict:
+        """执行一次完整的查询流程"""
+        _LOGGER.debug(f"开始第 {attempt} 次尝试获取水费数据")
 
-                # 第一步：访问主页面建立会话
+        try:
+            # 第一步：访问主页面建立会话
+            with stage_span(timeline, STAGE_VISIT, attempt):
                 await self._visit_main_page()
 
-                # 第二步：获取验证码
-                captcha_text, confidence = await self._get_captcha()
+            # 第二步：获取验证码
+            with stage_span(timeline, STAGE_CAPTCHA_DOWNLOAD, attempt):
+                image_data = await self._download_captcha()
+            with stage_span(timeline, STAGE_RECOGNIZE, attempt):
+                captcha_text, confidence = await self._recognize_captcha(image_data)
 
-                # 第三步：提交查询请求
+            # 第三步：提交查询请求
+            with stage_span(timeline, STAGE_SUBMIT, attempt):
                 response_text = await self._submit_query(user_id, captcha_text)
 
-                # 第四步：解析响应数据
-                result = self._parse_response(response_text)
-
-                if result.get("success"):
-                    _LOGGER.info(
-                        f"第 {attempt + 1} 次尝试成功，验证码: {captcha_text}, 置信度: {confidence:.3f}"
-                    )
-                    return result
-                else:
-                    # 解析失败，检查是否需要重试
-                    error_msg = result.get("error", "未知错误")
-                    _LOGGER.warning(f"第 {attempt + 1} 次尝试失败: {error_msg}")
-                    last_error = Exception(error_msg)
-
-                    # 只在验证码错误时重试
-                    should_retry = (
-                        "验证码错误" in error_msg
-                        or "状态码: 1" in error_msg
-                        or "验证码" in error_msg
-                    )
-
-                    if should_retry and attempt < self._max_retries - 1:
-                        _LOGGER.info(f"验证码相关错误，将进行第 {attempt + 2} 次重试")
-                        continue
-                    else:
-                        _LOGGER.info(f"非验证码错误或已达最大重试次数，停止重试")
-                        break
-
-            except Exception as e:
-                _LOGGER.warning(f"第 {attempt + 1} 次尝试出现异常: {e}")
-                last_error = e
-
-                # 网络超时等异常可以重试
-                should_retry = (
-                    "timeout" in str(e).lower()
-                    or "connection" in str(e).lower()
-                    or "network" in str(e).lower()
-                )
-
-                if should_retry and attempt < self._max_retries - 1:
-                    _LOGGER.info(f"网络相关异常，将进行第 {attempt + 2} 次重试")
-                    continue
-                else:
-                    _LOGGER.info(f"非网络异常或已达最大重试次数，停止重试")
-                    break
-
-        # 所有重试都失败了
-        error_msg = f"经过 {self._max_retries} 次重试后仍然失败"
-        if last_error:
-            error_msg += f": {last_error}"
-
-        _LOGGER.error(error_msg)
-        return {"success": False, "error": error_msg}
+            # 第四步：解析响应数据
+            with stage_span(timeline, STAGE_PARSE, attempt):
+                result = self._parse_response(response_text, watermarks)
+
+        except CdwaterError as e:
+            _LOGGER.warning(f"第 {attempt} 次尝试失败: {e}")
+            raise
+
+        _LOGGER.info(
+            f"第 {attempt} 次尝试成功，验证码: {captcha_text}, 置信度: {confidence:.3f}"
+        )
+        return result
 
     async def _visit_main_page(self):
         """访问主页面建立会话"""
         try:
-            async with self._session.get(WATERBILL_URL) as response:
-                if response.status != 200:
-                    raise Exception(f"访问主页面失败: {response.status}")
-                _LOGGER.debug("成功访问主页面")
-        except Exception as e:
+            exchange = await self._transport.request(KIND_VISIT, self._waterbill_url)
+            self._check_status(exchange.status, "访问主页面失败")
+            _LOGGER.debug("成功访问主页面")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             _LOGGER.error(f"访问主页面失败: {e}")
-            raise
+            raise NetworkError(f"访问主页面失败: {e}") from e
 
-    async def _get_captcha(self) -> tuple:
-        """获取并识别验证码
+    async def _download_captcha(self) -> bytes:
+        """下载验证码图片"""
+        if not (self._captcha_recognizer and self._captcha_recognizer.is_available()):
+            raise CdwaterError("没有可用的验证码识别方法")
 
-        Returns:
-            (验证码文本, 置信度)
-        """
         # 生成随机值
         random_value = str(random.random())
-        captcha_url = RECORD_URL_TEMPLATE.format(random_value=random_value)
+        captcha_url = self._record_url_template.format(random_value=random_value)
 
         try:
-            async with self._session.get(captcha_url) as response:
-                if response.status != 200:
-                    raise Exception(f"获取验证码失败: {response.status}")
-
-                image_data = await response.read()
-
-                # 识别验证码
-                if self._captcha_recognizer and self._captcha_recognizer.is_available():
-                    captcha_text, confidence = await self._captcha_recognizer.recognize(
-                        image_data
-                    )
-                else:
-                    raise Exception("没有可用的验证码识别方法")
+            exchange = await self._transport.request(KIND_CAPTCHA, captcha_url)
+            self._check_status(exchange.status, "获取验证码失败")
+            return exchange.content
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _LOGGER.error(f"获取验证码失败: {e}")
+            raise NetworkError(f"获取验证码失败: {e}") from e
 
-                _LOGGER.debug(
-                    f"验证码识别成功: {captcha_text}, 置信度: {confidence:.3f}"
-                )
-                return captcha_text, confidence
+    async def _recognize_captcha(self, image_data: bytes) -> tuple:
+        """识别验证码
 
+        Returns:
+            (验证码文本, 置信度)
+        """
+        try:
+            captcha_text, confidence = await self._captcha_recognizer.recognize(
+                image_data
+            )
         except Exception as e:
-            _LOGGER.error(f"获取验证码失败: {e}")
-            raise
+            _LOGGER.error(f"识别验证码失败: {e}")
+            raise CaptchaError(f"识别验证码失败: {e}") from e
+
+        _LOGGER.debug(f"验证码识别成功: {captcha_text}, 置信度: {confidence:.3f}")
+        return captcha_text, confidence
 
     async def _submit_query(self, user_id: str, captcha_text: str) -> str:
         """提交查询请求"""
         # 生成随机值
         random_value = str(random.random())
-        api_url = API_URL_TEMPLATE.format(random_value=random_value)
+        api_url = self._api_url_template.format(random_value=random_value)
 
         # 构建查询参数
         params = {"method": "getwaterbillsign", "kh": user_id, "yzm": captcha_text}
 
         # 更新请求头
         headers = {
-            "Referer": WATERBILL_URL,
+            "Referer": self._waterbill_url,
             "Accept": "text/plain, */*; q=0.01",
         }
 
         try:
-            async with self._session.get(
-                api_url, params=params, headers=headers
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"查询请求失败: {response.status}")
-
-                response_text = await response.text()
-                _LOGGER.debug(f"查询响应: {response_text[:200]}...")
-                return response_text
+            exchange = await self._transport.request(
+                KIND_QUERY, api_url, params=params, headers=headers
+            )
+            self._check_status(exchange.status, "查询请求失败")
+            response_text = exchange.text
+            _LOGGER.debug(f"查询响应: {response_text[:200]}...")
+            return response_text
 
-        except Exception as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             _LOGGER.error(f"提交查询失败: {e}")
-            raise
-
-    def _parse_response(self, response_text: str) -> Dict:
-        """解析响应数据"""
-        try:
-            _LOGGER.debug(f"开始解析响应数据，响应长度: {len(response_text)}")
-            # 检查响应状态
-            parts = response_text.split("w|f")
-
-            if len(parts) == 0:
-                raise Exception("响应格式错误：无法分割响应")
+            raise NetworkError(f"提交查询失败: {e}") from e
 
-            status_code = parts[0]
+    @staticmethod
+    def _check_status(status: int, message: str):
+        """检查HTTP状态码"""
+        if status != 200:
+            raise ServerError(f"{message}: {status}", status=status)
 
-            if status_code != "1":
-                error_msg = parts[1] if len(parts) > 1 else "未知错误"
-                raise Exception(f"查询失败，状态码: {status_code}, 原因: {error_msg}")
+    def _parse_response(
+        self, response_text: str, watermarks: Optional[Dict[str, str]] = None
+    ) -> Dict:
+        """解析响应数据
 
-            # 提取HTML部分
-            html_part = response_text.split("w|f")[-1]
-
-            # 解析HTML
-            parser = CdwaterHTMLParser()
-            parser.feed(html_part)
-
-            _LOGGER.debug(f"解析到 {len(parser.tables)} 个表格")
-
-            water_bills = self._parse_water_bills(parser.tables)
-            garbage_fees = self._parse_garbage_fees(parser.tables)
-            water_arrears = self._parse_water_arrears(parser.tables)
-            garbage_arrears = self._parse_garbage_arrears(parser.tables)
-
-            _LOGGER.info(
-                f"解析结果: 水费账单 {len(water_bills)} 条, 垃圾费 {len(garbage_fees)} 条, 水费欠费 {len(water_arrears)} 条, 垃圾费欠费 {len(garbage_arrears)} 条"
-            )
-
-            return {
-                "water_bills": water_bills,
-                "garbage_fees": garbage_fees,
-                "water_arrears": water_arrears,
-                "garbage_arrears": garbage_arrears,
-                "success": True,
-            }
-
-        except Exception as e:
-            _LOGGER.error(f"解析响应数据失败: {e}")
-            _LOGGER.debug(f"失败的响应文本: {response_text}")
-            return {"success": False, "error": str(e)}
-
-    def _parse_water_bills(self, tables: List[List[List[str]]]) -> List[Dict]:
-        """解析水费账单数据"""
-        bills = []
-
-        if not tables:
-            return bills
-
-        # 第一个表格是水费数据
-        water_table = tables[0]
-        _LOGGER.debug(f"水费表格有 {len(water_table)} 行")
-
-        if len(water_table) < 2:
-            return bills
-
-        # 跳过表头，解析数据行
-        for row in water_table[1:]:
-            if len(row) >= 14:
-                bill = {
-                    "user_id": self._clean_text(row[0]),
-                    "meter_date": self._clean_text(row[1]),
-                    "previous_reading": self._safe_float(row[2]),
-                    "current_reading": self._safe_float(row[3]),
-                    "usage": self._safe_float(row[4]),
-                    "unit_price": self._safe_float(row[5]),
-                    "amount_due": self._safe_float(row[6]),
-                    "amount_paid": self._safe_float(row[7]),
-                    "previous_balance": self._safe_float(row[8]),
-                    "current_balance": self._safe_float(row[9]),
-                    "penalty_due": self._safe_float(row[10]),
-                    "penalty_paid": self._safe_float(row[11]),
-                    "payment_date": self._clean_text(row[12]),
-                    "payment_status": self._clean_text(row[13]),
-                }
-                bills.append(bill)
-
-        return bills
-
-    def _parse_garbage_fees(self, tables: List[List[List[str]]]) -> List[Dict]:
-        """解析垃圾处理费数据"""
-        fees = []
-
-        if len(tables) < 2:
-            return fees
-
-        # 第二个表格是垃圾处理费数据
-        garbage_table = tables[1]
-
-        if len(garbage_table) < 2:
-            return fees
-
-        # 跳过表头，解析数据行
-        for row in garbage_table[1:]:
-            if len(row) >= 8:
-                fee = {
-                    "user_id": self._clean_text(row[0]),
-                    "bill_date": self._clean_text(row[1]),
-                    "unit_price": self._safe_float(row[2]),
-                    "period_months": self._safe_int(row[3]),
-                    "amount_due": self._safe_float(row[4]),
-                    "amount_paid": self._safe_float(row[5]),
-                    "payment_date": self._clean_text(row[6]),
-                    "payment_status": self._clean_text(row[7]),
-                }
-                fees.append(fee)
-
-        return fees
-
-    def _parse_water_arrears(self, tables: List[List[List[str]]]) -> List[Dict]:
-        """解析水费欠费数据"""
-        # 查找水费欠费表格（通常为空）
-        return []
-
-    def _parse_garbage_arrears(self, tables: List[List[List[str]]]) -> List[Dict]:
-        """解析垃圾处理费欠费数据"""
-        arrears = []
-
-        if len(tables) < 4:
-            return arrears
-
-        # 第四个表格是垃圾处理费欠费数据
-        arrears_table = tables[3]
-
-        if len(arrears_table) < 2:
-            return arrears
-
-        # 跳过表头，解析数据行
-        for row in arrears_table[1:]:
-            if len(row) >= 7:
-                arrear = {
-                    "user_id": self._clean_text(row[0]),
-                    "bill_date": self._clean_text(row[1]),
-                    "unit_price": self._safe_float(row[2]),
-                    "period_months": self._safe_int(row[3]),
-                    "amount_due": self._safe_float(row[4]),
-                    "amount_paid": self._safe_float(row[5]),
-                    "payment_status": self._clean_text(row[6]),
-                }
-                arrears.append(arrear)
-
-        return arrears
-
-    def _clean_text(self, text: str) -> str:
-        """清理文本内容"""
-        if not text:
-            return ""
-        return text.replace("\xa0", "").replace("&nbsp;", "").strip()
-
-    def _safe_float(self, text: str) -> float:
-        """安全转换为浮点数"""
-        try:
-            cleaned = self._clean_text(text)
-            return float(cleaned) if cleaned else 0.0
-        except (ValueError, TypeError):
-            return 0.0
-
-    def _safe_int(self, text: str) -> int:
-        """安全转换为整数"""
-        try:
-            cleaned = self._clean_text(text)
-            return int(cleaned) if cleaned else 0
-        except (ValueError, TypeError):
-            return 0
+        Raises:
+            CdwaterError: 查询被服务器拒绝或响应无法解析
+        """
+        return parse_response(response_text, watermarks=watermarks)
@@ -14,13 +14,26 @@ from .const import (
     CONF_CHAOJIYING_USER,
     CONF_CHAOJIYING_PASS,
     CONF_CHAOJIYING_SOFTID,
+    CONF_REMOTE_NCC_URL,
     DEFAULT_UPDATE_INTERVAL,
     CAPTCHA_METHOD_NCC,
     CAPTCHA_METHOD_CHAOJIYING,
+    CAPTCHA_METHOD_REMOTE_NCC,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
+CAPTCHA_METHODS = {
+    CAPTCHA_METHOD_NCC: CAPTCHA_METHOD_NCC,
+    CAPTCHA_METHOD_CHAOJIYING: CAPTCHA_METHOD_CHAOJIYING,
+    CAPTCHA_METHOD_REMOTE_NCC: CAPTCHA_METHOD_REMOTE_NCC,
+}
+
+
+def _valid_url(url: str) -> bool:
+    """识别服务地址必须是 http(s) 地址"""
+    return url.startswith(("http://", "https://"))
+
 
 class CdwaterConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """成都自来水配置流程"""
@@ -67,6 +80,8 @@ class CdwaterConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
             if captcha_method == CAPTCHA_METHOD_CHAOJIYING:
                 return await self.async_step_chaojiying()
+            elif captcha_method == CAPTCHA_METHOD_REMOTE_NCC:
+                return await self.async_step_remote_ncc()
             else:
                 # NCC方法，直接创建条目
                 user_id = self._user_input[CONF_USER_ID]
@@ -80,10 +95,7 @@ class CdwaterConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         data_schema = vol.Schema(
             {
                 vol.Required(CONF_CAPTCHA_METHOD, default=CAPTCHA_METHOD_NCC): vol.In(
-                    {
-                        CAPTCHA_METHOD_NCC: CAPTCHA_METHOD_NCC,
-                        CAPTCHA_METHOD_CHAOJIYING: CAPTCHA_METHOD_CHAOJIYING,
-                    }
+                    CAPTCHA_METHODS
                 ),
             }
         )
@@ -132,6 +144,35 @@ class CdwaterConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             step_id="chaojiying", data_schema=data_schema, errors=errors
         )
 
+    async def async_step_remote_ncc(self, user_input=None) -> FlowResult:
+        """处理远程NCC识别服务配置步骤"""
+        errors = {}
+
+        if user_input is not None:
+            url = user_input[CONF_REMOTE_NCC_URL].strip()
+            if not _valid_url(url):
+                errors[CONF_REMOTE_NCC_URL] = "invalid_url"
+            else:
+                self._user_input[CONF_REMOTE_NCC_URL] = url
+                user_id = self._user_input[CONF_USER_ID]
+
+                await self.async_set_unique_id(user_id)
+                self._abort_if_unique_id_configured()
+
+                return self.async_create_entry(
+                    title=f"成都自来水 - {user_id}", data=self._user_input
+                )
+
+        data_schema = vol.Schema(
+            {
+                vol.Required(CONF_REMOTE_NCC_URL): str,
+            }
+        )
+
+        return self.async_show_form(
+            step_id="remote_ncc", data_schema=data_schema, errors=errors
+        )
+
     @staticmethod
     @callback
     def async_get_options_flow(config_entry):
@@ -146,6 +187,18 @@ class CdwaterOptionsFlow(config_entries.OptionsFlow):
         """初始化选项流程"""
         self.config_entry = config_entry
 
+    def _current(self, key: str, default):
+        """当前配置值，选项优先于初始配置"""
+        if key in self.config_entry.options:
+            return self.config_entry.options[key]
+        return self.config_entry.data.get(key, default)
+
+    def _save(self, user_input: dict) -> FlowResult:
+        """保存选项，保留其他菜单中已经设置的值"""
+        return self.async_create_entry(
+            title="", data={**self.config_entry.options, **user_input}
+        )
+
     async def async_step_init(self, user_input=None) -> FlowResult:
         """处理选项配置初始步骤"""
         return self.async_show_menu(
@@ -155,7 +208,7 @@ class CdwaterOptionsFlow(config_entries.OptionsFlow):
     async def async_step_update_interval(self, user_input=None) -> FlowResult:
         """处理更新间隔配置"""
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
+            return self._save(user_input)
 
         current_interval = self.config_entry.options.get(
             CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL
@@ -180,21 +233,19 @@ class CdwaterOptionsFlow(config_entries.OptionsFlow):
                 # 需要配置超级鹰参数
                 self._temp_data = user_input
                 return await self.async_step_chaojiying_options()
+            elif captcha_method == CAPTCHA_METHOD_REMOTE_NCC:
+                self._temp_data = user_input
+                return await self.async_step_remote_ncc_options()
             else:
                 # NCC方法，直接保存
-                return self.async_create_entry(title="", data=user_input)
+                return self._save(user_input)
 
-        current_method = self.config_entry.data.get(
-            CONF_CAPTCHA_METHOD, CAPTCHA_METHOD_NCC
-        )
+        current_method = self._current(CONF_CAPTCHA_METHOD, CAPTCHA_METHOD_NCC)
 
         data_schema = vol.Schema(
             {
                 vol.Required(CONF_CAPTCHA_METHOD, default=current_method): vol.In(
-                    {
-                        CAPTCHA_METHOD_NCC: CAPTCHA_METHOD_NCC,
-                        CAPTCHA_METHOD_CHAOJIYING: CAPTCHA_METHOD_CHAOJIYING,
-                    }
+                    CAPTCHA_METHODS
                 ),
             }
         )
@@ -206,11 +257,11 @@ class CdwaterOptionsFlow(config_entries.OptionsFlow):
         if user_input is not None:
             # 合并数据
             final_data = {**self._temp_data, **user_input}
-            return self.async_create_entry(title="", data=final_data)
+            return self._save(final_data)
 
-        current_user = self.config_entry.data.get(CONF_CHAOJIYING_USER, "")
-        current_pass = self.config_entry.data.get(CONF_CHAOJIYING_PASS, "")
-        current_softid = self.config_entry.data.get(CONF_CHAOJIYING_SOFTID, "")
+        current_user = self._current(CONF_CHAOJIYING_USER, "")
+        current_pass = self._current(CONF_CHAOJIYING_PASS, "")
+        current_softid = self._current(CONF_CHAOJIYING_SOFTID, "")
 
         data_schema = vol.Schema(
             {
@@ -223,3 +274,27 @@ class CdwaterOptionsFlow(config_entries.OptionsFlow):
         return self.async_show_form(
             step_id="chaojiying_options", data_schema=data_schema
         )
+
+    async def async_step_remote_ncc_options(self, user_input=None) -> FlowResult:
+        """处理远程NCC识别服务选项配置"""
+        errors = {}
+
+        if user_input is not None:
+            url = user_input[CONF_REMOTE_NCC_URL].strip()
+            if not _valid_url(url):
+                errors[CONF_REMOTE_NCC_URL] = "invalid_url"
+            else:
+                final_data = {**self._temp_data, CONF_REMOTE_NCC_URL: url}
+                return self._save(final_data)
+
+        current_url = self._current(CONF_REMOTE_NCC_URL, "")
+
+        data_schema = vol.Schema(
+            {
+                vol.Required(CONF_REMOTE_NCC_URL, default=current_url): str,
+            }
+        )
+
+        return self.async_show_form(
+            step_id="remote_ncc_options", data_schema=data_schema, errors=errors
+        )
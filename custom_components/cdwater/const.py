@@ -9,6 +9,7 @@ CONF_CAPTCHA_METHOD = "captcha_method"
 CONF_CHAOJIYING_USER = "chaojiying_user"
 CONF_CHAOJIYING_PASS = "chaojiying_pass"
 CONF_CHAOJIYING_SOFTID = "chaojiying_softid"
+CONF_REMOTE_NCC_URL = "remote_ncc_url"
 
 # 默认值
 DEFAULT_UPDATE_INTERVAL = 1  # 天
@@ -16,3 +17,25 @@ DEFAULT_UPDATE_INTERVAL = 1  # 天
 # 验证码识别方式
 CAPTCHA_METHOD_NCC = "ncc"
 CAPTCHA_METHOD_CHAOJIYING = "chaojiying"
+CAPTCHA_METHOD_REMOTE_NCC = "remote_ncc"
+
+# 持久化存储
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10  # 秒
+
+# 距上次成功查询不足该秒数的刷新请求直接使用上次结果
+REFRESH_FRESHNESS_SECONDS = 60
+
+# hass.data[DOMAIN] 中共享 CdwaterHub 的键
+DATA_HUB = "hub"
+
+# 账单历史导出目录（位于配置目录下）
+EXPORT_DIR = "cdwater_exports"
+
+# 刷新队列：同时进行的查询数、相邻查询开始的最小间隔、各账号首次排定刷新的错开量
+REFRESH_MAX_CONCURRENT = 1
+REFRESH_SPACING_SECONDS = 10
+REFRESH_STAGGER_SECONDS = 300
+
+# 是否记录每次刷新的分阶段耗时，关闭后诊断信息中只保留计数器
+METRICS_ENABLED = True
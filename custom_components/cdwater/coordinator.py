@@ -1,10 +1,15 @@
 """数据更新协调器"""
 
+import asyncio
 import logging
+import time
 from datetime import timedelta
+from typing import Callable, Dict, FrozenSet, Optional
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
 from .const import (
     DOMAIN,
@@ -14,24 +19,88 @@ from .const import (
     CONF_CHAOJIYING_USER,
     CONF_CHAOJIYING_PASS,
     CONF_CHAOJIYING_SOFTID,
+    CONF_REMOTE_NCC_URL,
     DEFAULT_UPDATE_INTERVAL,
     CAPTCHA_METHOD_NCC,
     CAPTCHA_METHOD_CHAOJIYING,
+    CAPTCHA_METHOD_REMOTE_NCC,
+    STORAGE_VERSION,
+    STORAGE_SAVE_DELAY,
+    REFRESH_FRESHNESS_SECONDS,
+    METRICS_ENABLED,
 )
 from .client import CdwaterClient
-from .captcha import CaptchaRecognizer
+from .exceptions import CdwaterError
+from .export import export_history
+from .history import BillHistoryStore
+from .hub import CdwaterHub
+from .scheduler import AdaptivePollingScheduler
+from .statistics_import import async_import_statistics
+from .snapshot import EMPTY_SNAPSHOT, BillSnapshot, build_snapshot, diff_snapshots
+from .metrics import FetchMetrics
+from .profiling import async_profile
+from .records import (
+    HISTORY_DATE_FIELDS,
+    RECORD_TYPES,
+    merge_records,
+    data_to_dict,
+    data_from_dict,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def storage_key(entry_id: str) -> str:
+    """配置条目对应的存储键"""
+    return f"{DOMAIN}.{entry_id}"
+
+
+def history_path(hass: HomeAssistant, user_id: str) -> str:
+    """用户号对应的账单历史库路径"""
+    return hass.config.path(".storage", f"{DOMAIN}_history_{user_id}.db")
+
+
 class CdwaterDataUpdateCoordinator(DataUpdateCoordinator):
     """成都自来水数据更新协调器"""
 
-    def __init__(self, hass: HomeAssistant, entry: ConfigEntry):
-        """初始化协调器"""
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, hub: CdwaterHub):
+        """初始化协调器
+
+        Args:
+            hass: Home Assistant 实例
+            entry: 配置条目
+            hub: 所有账号共用的连接池、识别器和刷新队列
+        """
         self.entry = entry
+        self.hub = hub
         self.user_id = entry.data[CONF_USER_ID]
 
+        # 各阶段耗时统计
+        self.metrics = FetchMetrics(enabled=METRICS_ENABLED)
+        # 最近一次 profile_refresh 服务的剖析结果
+        self.last_profile: Optional[Dict] = None
+
+        # 每次数据变化后计算一次的账单快照，实体从这里读取
+        self.snapshot: BillSnapshot = EMPTY_SNAPSHOT
+        # 最近一次快照更新中变化的字段
+        self.changed_fields: FrozenSet[str] = frozenset()
+
+        # 正在进行的查询，用于合并并发的刷新请求
+        self._inflight: Optional[asyncio.Task] = None
+        self._last_fetch_success: Optional[float] = None
+
+        # 上次成功获取的数据，启动时先用它创建实体
+        self._store = Store(hass, STORAGE_VERSION, storage_key(entry.entry_id))
+        self._saved_at = None
+        # 最近一次延迟保存的数据生成函数，关闭时立即写入
+        self._pending_save: Optional[Callable[[], Dict]] = None
+
+        # 账单历史库，保留网站查询窗口之外的记录
+        self.history = BillHistoryStore(history_path(hass, self.user_id))
+        self._history_synced = False
+        # 是否已把账单导入长期统计
+        self._statistics_synced = False
+
         # 初始化验证码识别器
         self._captcha_recognizer = self._create_captcha_recognizer()
 
@@ -41,56 +110,333 @@ class CdwaterDataUpdateCoordinator(DataUpdateCoordinator):
         )
         update_interval = timedelta(days=update_interval_days)
 
+        # 按抄表周期调整刷新间隔
+        self.scheduler = AdaptivePollingScheduler(update_interval)
+        # 多个账号错开刷新：只加在设置后第一次排定的刷新上，之后按调度器的间隔
+        self._start_offset = hub.stagger_offset(entry.entry_id)
+
         super().__init__(
             hass,
             _LOGGER,
             name=f"{DOMAIN}_{self.user_id}",
-            update_interval=update_interval,
+            update_interval=update_interval + self._start_offset,
+            # 数据没有变化时不通知实体
+            always_update=False,
         )
 
+    def _entry_value(self, key: str, default=None):
+        """读取配置，选项流程保存的值优先于初始配置"""
+        if key in self.entry.options:
+            return self.entry.options[key]
+        return self.entry.data.get(key, default)
+
     def _create_captcha_recognizer(self):
         """创建验证码识别器"""
-        captcha_method = self.entry.data.get(CONF_CAPTCHA_METHOD, CAPTCHA_METHOD_NCC)
+        captcha_method = self._entry_value(CONF_CAPTCHA_METHOD, CAPTCHA_METHOD_NCC)
 
         try:
             if captcha_method == CAPTCHA_METHOD_CHAOJIYING:
-                username = self.entry.data.get(CONF_CHAOJIYING_USER)
-                password = self.entry.data.get(CONF_CHAOJIYING_PASS)
-                soft_id = self.entry.data.get(CONF_CHAOJIYING_SOFTID)
+                username = self._entry_value(CONF_CHAOJIYING_USER)
+                password = self._entry_value(CONF_CHAOJIYING_PASS)
+                soft_id = self._entry_value(CONF_CHAOJIYING_SOFTID)
 
                 if not all([username, password, soft_id]):
                     _LOGGER.warning("超级鹰配置不完整，回退到NCC方法")
-                    return CaptchaRecognizer(method=CAPTCHA_METHOD_NCC)
+                    return self.hub.recognizer(CAPTCHA_METHOD_NCC)
 
-                return CaptchaRecognizer(
-                    method=CAPTCHA_METHOD_CHAOJIYING,
+                return self.hub.recognizer(
+                    CAPTCHA_METHOD_CHAOJIYING,
                     username=username,
                     password=password,
                     soft_id=soft_id,
                 )
+            elif captcha_method == CAPTCHA_METHOD_REMOTE_NCC:
+                url = self._entry_value(CONF_REMOTE_NCC_URL)
+                if not url:
+                    _LOGGER.warning("远程NCC识别服务地址未配置，回退到NCC方法")
+                    return self.hub.recognizer(CAPTCHA_METHOD_NCC)
+                return self.hub.recognizer(CAPTCHA_METHOD_REMOTE_NCC, url=url)
             else:
-                return CaptchaRecognizer(method=CAPTCHA_METHOD_NCC)
+                return self.hub.recognizer(CAPTCHA_METHOD_NCC)
 
         except Exception as e:
             _LOGGER.error(f"创建验证码识别器失败: {e}，回退到NCC方法")
-            return CaptchaRecognizer(method=CAPTCHA_METHOD_NCC)
+            return self.hub.recognizer(CAPTCHA_METHOD_NCC)
 
     async def _async_update_data(self):
-        """更新数据"""
-        try:
-            # 使用3次重试机制
-            async with CdwaterClient(self._captcha_recognizer, max_retries=3) as client:
-                data = await client.get_water_bill_data(self.user_id)
+        """更新数据
+
+        同一时间只进行一次查询：并发的刷新请求等待正在进行的查询，
+        刚成功查询过的请求直接使用上次的结果。
+        """
+        if self._inflight is not None:
+            self.metrics.increment("refresh_coalesced")
+            _LOGGER.debug(f"用户 {self.user_id} 已有查询在进行，等待其结果")
+            return await asyncio.shield(self._inflight)
+
+        if (
+            self.data is not None
+            and self._last_fetch_success is not None
+            and time.monotonic() - self._last_fetch_success < REFRESH_FRESHNESS_SECONDS
+        ):
+            self.metrics.increment("refresh_fresh_hits")
+            _LOGGER.debug(f"用户 {self.user_id} 的数据刚刚更新过，跳过本次查询")
+            return self.data
+
+        self.metrics.increment("refresh_fetches")
+        # 后台任务不会阻塞 Home Assistant 启动时的 async_block_till_done
+        task = self.hass.async_create_background_task(
+            self._async_fetch_data(), f"{DOMAIN}_{self.user_id}_fetch"
+        )
+        self._inflight = task
+        task.add_done_callback(self._async_fetch_done)
+        return await asyncio.shield(task)
+
+    def _async_fetch_done(self, task: asyncio.Task):
+        """查询结束，允许发起新的查询"""
+        if self._inflight is task:
+            self._inflight = None
+        if not task.cancelled() and task.exception() is None:
+            self._last_fetch_success = time.monotonic()
 
-                if not data.get("success", False):
-                    raise UpdateFailed(f"获取数据失败: {data.get('error', '未知错误')}")
+    async def _async_fetch_data(self):
+        """查询并合并数据"""
+        timeline = self.metrics.start_timeline()
+        outcome = None
+        try:
+            # 在共享的刷新队列中查询，避免多个账号同时访问网站
+            data = await self.hub.async_run(lambda: self._async_query(timeline))
 
-                _LOGGER.debug(f"成功获取用户 {self.user_id} 的数据")
-                return data
+            _LOGGER.debug(f"成功获取用户 {self.user_id} 的数据")
+            outcome = "success"
+            merged = self._merge_data(data)
+            changed = merged is not self.data
+            if changed:
+                self._set_snapshot(build_snapshot(merged))
+                self._async_schedule_save(merged)
+            if changed or not self._history_synced:
+                await self._async_update_history(merged)
+            if changed or not self._statistics_synced:
+                await self._async_import_statistics(merged)
+            self._async_reschedule(merged, changed)
+            return merged
 
+        except CdwaterError as err:
+            outcome = type(err).__name__
+            _LOGGER.error(f"更新数据失败: {err}")
+            raise UpdateFailed(f"获取数据失败: {err}") from err
         except Exception as err:
+            outcome = type(err).__name__
             _LOGGER.error(f"更新数据失败: {err}")
-            raise UpdateFailed(f"更新数据失败: {err}")
+            raise UpdateFailed(f"更新数据失败: {err}") from err
+        finally:
+            if timeline is not None:
+                timeline.finish(outcome or "cancelled")
+                self.metrics.record(timeline)
+
+    async def _async_query(self, timeline):
+        """使用共享连接池查询一次账单"""
+        # 使用3次重试机制
+        async with CdwaterClient(
+            self._captcha_recognizer, max_retries=3, connector=self.hub.connector
+        ) as client:
+            return await client.get_water_bill_data(
+                self.user_id, timeline, watermarks=self._watermarks()
+            )
+
+    async def async_restore_data(self) -> bool:
+        """从存储恢复上次成功获取的数据
+
+        Returns:
+            是否恢复成功
+        """
+        try:
+            stored = await self._store.async_load()
+        except Exception as err:
+            _LOGGER.warning(f"读取用户 {self.user_id} 的缓存数据失败: {err}")
+            return False
+
+        if not stored or not stored.get("data"):
+            return False
+
+        try:
+            self.data = data_from_dict(stored["data"])
+        except (KeyError, TypeError) as err:
+            _LOGGER.warning(f"用户 {self.user_id} 的缓存数据格式错误: {err}")
+            return False
+
+        self._saved_at = dt_util.parse_datetime(stored.get("saved_at") or "")
+        self._set_snapshot(build_snapshot(self.data))
+        self._learn_billing_cycle(self.data)
+        self.update_interval = self._next_interval()
+        if not self.restored_data_is_stale:
+            # 不需要立即刷新，错开量已加在下一次排定的刷新上
+            self._start_offset = timedelta(0)
+        _LOGGER.debug(f"已恢复用户 {self.user_id} 的缓存数据，保存于 {self._saved_at}")
+        return True
+
+    @property
+    def restored_data_is_stale(self) -> bool:
+        """恢复的数据是否已超过一个更新间隔"""
+        if self._saved_at is None or self.update_interval is None:
+            return True
+        return dt_util.utcnow() - self._saved_at >= self.update_interval
+
+    def _async_schedule_save(self, data):
+        """延迟保存数据，合并短时间内的多次写入"""
+        saved_at = dt_util.utcnow()
+        self._saved_at = saved_at
+        self._pending_save = lambda: {
+            "saved_at": saved_at.isoformat(),
+            "data": data_to_dict(data),
+        }
+        self._store.async_delay_save(self._pending_save, STORAGE_SAVE_DELAY)
+
+    def _set_snapshot(self, snapshot: BillSnapshot):
+        """更新快照并记录变化的字段"""
+        self.changed_fields = diff_snapshots(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        _LOGGER.debug(f"用户 {self.user_id} 快照变化字段: {sorted(self.changed_fields)}")
+
+    async def _async_update_history(self, data):
+        """将数据合并到账单历史库"""
+        try:
+            await self.hass.async_add_executor_job(self.history.upsert, data)
+            self._history_synced = True
+        except Exception as err:
+            _LOGGER.warning(f"写入用户 {self.user_id} 的账单历史失败: {err}")
+
+    async def _async_import_statistics(self, data):
+        """将账单中新的账期导入长期统计"""
+        if "recorder" not in self.hass.config.components:
+            return
+        try:
+            await async_import_statistics(self.hass, self.user_id, data)
+            self._statistics_synced = True
+        except Exception as err:
+            _LOGGER.warning(f"导入用户 {self.user_id} 的长期统计失败: {err}")
+
+    async def async_export_history(
+        self, path: str, fmt: str, start=None, end=None
+    ) -> Dict:
+        """把账单历史逐条导出到文件
+
+        Args:
+            path: 目标文件路径
+            fmt: csv 或 jsonl
+            start: 起始账期日期（包含）
+            end: 截止账期日期（包含）
+
+        Returns:
+            导出统计
+        """
+        result = await self.hass.async_add_executor_job(
+            export_history, [self.history], path, fmt, None, start, end
+        )
+        _LOGGER.info(
+            f"用户 {self.user_id} 的账单历史已导出到 {path}: {result['records']}"
+        )
+        return result
+
+    async def async_profile_refresh(self, top: int = 30) -> Dict:
+        """在 cProfile 和 tracemalloc 下执行一次真实查询
+
+        Args:
+            top: 剖析结果保留的条数
+        """
+        # 跳过新鲜度判断，保证真正访问网站
+        self._last_fetch_success = None
+        profile = await async_profile(self.async_refresh, top)
+        # async_refresh 自己捕获查询异常，失败只体现在 last_update_success 上
+        if profile["error"] is None and not self.last_update_success:
+            err = self.last_exception
+            profile["error"] = f"{type(err).__name__}: {err}" if err else "刷新失败"
+        self.last_profile = profile
+        _LOGGER.info(
+            f"用户 {self.user_id} 的刷新剖析完成，耗时 {self.last_profile['duration']} 秒"
+        )
+        return self.last_profile
+
+    async def async_shutdown(self) -> None:
+        """关闭协调器"""
+        # 查询任务被 shield 保护，需要显式取消，避免卸载后继续写入存储和历史库
+        inflight = self._inflight
+        if inflight is not None and not inflight.done():
+            inflight.cancel()
+            try:
+                await inflight
+            except (asyncio.CancelledError, Exception):
+                pass
+        await super().async_shutdown()
+
+        # 立即写入尚未落盘的数据，同时取消延迟保存，
+        # 避免配置条目删除后延迟保存再把缓存文件写回来
+        pending = self._pending_save
+        if pending is not None:
+            self._pending_save = None
+            await self._store.async_save(pending())
+        await self.hass.async_add_executor_job(self.history.close)
+
+    def _learn_billing_cycle(self, data):
+        """从账单历史推算抄表周期"""
+        bills = data.get("water_bills") or []
+        self.scheduler.learn(
+            (bill.meter_date for bill in bills),
+            (bill.payment_date for bill in bills),
+        )
+
+    def _next_interval(self) -> timedelta:
+        """下一次刷新的间隔，尚未排定过刷新时加上配置条目的错开量"""
+        return self.scheduler.next_interval(dt_util.now()) + self._start_offset
+
+    def _async_reschedule(self, data, changed: bool):
+        """根据抄表周期调整下一次刷新的间隔"""
+        self.scheduler.record_refresh(changed)
+        if changed or self.scheduler.cycle is None:
+            self._learn_billing_cycle(data)
+
+        self.update_interval = self._next_interval()
+        self._start_offset = timedelta(0)
+        _LOGGER.debug(
+            f"用户 {self.user_id} 下次刷新间隔: {self.update_interval}，"
+            f"预计抄表日期: {self.scheduler.as_dict()['next_expected']}"
+        )
+
+    def _watermarks(self):
+        """已知的最新账期，用于增量解析"""
+        if not self.data:
+            return None
+
+        watermarks = {}
+        for key, date_field in HISTORY_DATE_FIELDS.items():
+            records = self.data.get(key)
+            if records:
+                watermarks[key] = getattr(records[0], date_field)
+        return watermarks or None
+
+    def _merge_data(self, data):
+        """将本次结果合并到已有数据，没有变化时返回原数据"""
+        if not self.data or not data.get("incremental"):
+            return {key: data[key] for key in RECORD_TYPES}
+
+        merged = {}
+        changed = False
+        for key in RECORD_TYPES:
+            date_field = HISTORY_DATE_FIELDS.get(key)
+            if date_field:
+                merged[key], table_changed = merge_records(
+                    self.data.get(key, []), data[key], date_field
+                )
+            else:
+                # 欠费是当前状态，直接替换
+                merged[key] = data[key]
+                table_changed = data[key] != self.data.get(key)
+            changed = changed or table_changed
+
+        if not changed:
+            _LOGGER.debug(f"用户 {self.user_id} 的账单没有变化")
+            return self.data
+        return merged
 
     async def async_update_captcha_config(self):
         """更新验证码配置"""
@@ -118,37 +464,33 @@ class CdwaterDataUpdateCoordinator(DataUpdateCoordinator):
         update_interval_days = self.entry.options.get(
             CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL
         )
-        self.update_interval = timedelta(days=update_interval_days)
-        _LOGGER.info(f"更新间隔已更新为: {update_interval_days} 天")
+        self.scheduler.base_interval = timedelta(days=update_interval_days)
+        if self.data:
+            self.update_interval = self._next_interval()
+        else:
+            self.update_interval = self.scheduler.base_interval + self._start_offset
+        _LOGGER.info(f"基础更新间隔已更新为: {update_interval_days} 天")
+
+    @property
+    def captcha_method(self) -> str:
+        """当前验证码识别方式"""
+        return self._captcha_recognizer.get_method() if self._captcha_recognizer else "unknown"
+
+    def captcha_stats(self) -> Dict:
+        """当前验证码识别器的统计信息，没有识别器时返回空字典"""
+        return self._captcha_recognizer.stats() if self._captcha_recognizer else {}
 
     @property
     def latest_water_bill(self):
         """获取最新的水费账单"""
-        if not self.data or not self.data.get("water_bills"):
-            return None
-        return self.data["water_bills"][0] if self.data["water_bills"] else None
+        return self.snapshot.latest_water_bill
 
     @property
     def latest_garbage_fee(self):
         """获取最新的垃圾处理费"""
-        if not self.data or not self.data.get("garbage_fees"):
-            return None
-        return self.data["garbage_fees"][0] if self.data["garbage_fees"] else None
+        return self.snapshot.latest_garbage_fee
 
     @property
     def total_arrears(self):
         """获取总欠费金额"""
-        if not self.data:
-            return 0
-
-        water_arrears = sum(
-            item.get("amount_due", 0) - item.get("amount_paid", 0)
-            for item in self.data.get("water_arrears", [])
-        )
-
-        garbage_arrears = sum(
-            item.get("amount_due", 0) - item.get("amount_paid", 0)
-            for item in self.data.get("garbage_arrears", [])
-        )
-
-        return water_arrears + garbage_arrears
+        return self.snapshot.total_arrears
@@ -0,0 +1,86 @@
+"""诊断信息"""
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    CONF_USER_ID,
+    CONF_CHAOJIYING_USER,
+    CONF_CHAOJIYING_PASS,
+    CONF_CHAOJIYING_SOFTID,
+    CONF_REMOTE_NCC_URL,
+)
+from .metrics import STAGE_RECOGNIZE
+
+# 用户号、超级鹰账号和远程识别服务地址都不出现在诊断信息中
+TO_REDACT = {
+    CONF_USER_ID,
+    CONF_CHAOJIYING_USER,
+    CONF_CHAOJIYING_PASS,
+    CONF_CHAOJIYING_SOFTID,
+    CONF_REMOTE_NCC_URL,
+    "title",
+}
+
+
+def _rate(counters: dict, hit: str, *others: str):
+    """命中次数占全部次数的比例"""
+    total = counters.get(hit, 0) + sum(counters.get(name, 0) for name in others)
+    return round(counters.get(hit, 0) / total, 3) if total else None
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    """获取配置条目的诊断信息"""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    metrics = coordinator.metrics.as_dict()
+    counters = metrics["counters"]
+    recognizer_stats = coordinator.captcha_stats()
+
+    history_bytes = await hass.async_add_executor_job(coordinator.history.size_bytes)
+
+    return {
+        "entry": async_redact_data(
+            {
+                # 标题默认包含用户号
+                "title": entry.title,
+                "data": dict(entry.data),
+                "options": dict(entry.options),
+            },
+            TO_REDACT,
+        ),
+        "captcha_method": coordinator.captcha_method,
+        "last_update_success": coordinator.last_update_success,
+        "update_interval": str(coordinator.update_interval),
+        "captcha": recognizer_stats,
+        "recognition_latency": coordinator.metrics.stage_summary(STAGE_RECOGNIZE),
+        "cache": {
+            # 刷新请求中直接使用上次结果、合并到进行中查询的比例
+            "refresh_fresh_hit_rate": _rate(
+                counters, "refresh_fresh_hits", "refresh_coalesced", "refresh_fetches"
+            ),
+            "refresh_coalesced_rate": _rate(
+                counters, "refresh_coalesced", "refresh_fresh_hits", "refresh_fetches"
+            ),
+            # 数据更新中被跳过的实体状态写入比例
+            "state_write_suppressed_rate": _rate(
+                counters, "state_writes_suppressed", "state_writes"
+            ),
+        },
+        "memory": {
+            "records": {
+                key: len(records)
+                for key, records in (coordinator.data or {}).items()
+                if isinstance(records, list)
+            },
+            "template_bytes": recognizer_stats.get("template_bytes"),
+            "history_db_bytes": history_bytes,
+        },
+        "scheduler": coordinator.scheduler.as_dict(),
+        "metrics": metrics,
+        "hub": coordinator.hub.as_dict(),
+        "last_profile": coordinator.last_profile,
+    }
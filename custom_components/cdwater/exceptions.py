@@ -0,0 +1,37 @@
+"""异常定义"""
+
+
+class CdwaterError(Exception):
+    """成都自来水集成基础异常"""
+
+
+class CaptchaError(CdwaterError):
+    """验证码获取或识别失败"""
+
+
+class CaptchaRejectedError(CaptchaError):
+    """验证码被服务器拒绝"""
+
+
+class SessionExpiredError(CdwaterError):
+    """会话失效，需要重新访问主页面"""
+
+
+class NetworkError(CdwaterError):
+    """网络连接失败或请求超时"""
+
+
+class ServerError(CdwaterError):
+    """服务器返回异常状态"""
+
+    def __init__(self, message: str, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ParseError(CdwaterError):
+    """响应数据无法解析"""
+
+
+class InvalidAccountError(CdwaterError):
+    """用户号无效或不存在"""
@@ -0,0 +1,128 @@
+"""账单历史导出
+
+把账单历史库中的水费账单、垃圾费和欠费逐条写成 CSV 或 JSON Lines。
+记录按账期范围从历史库的索引分批读取、逐行写出，内存占用与记录数和账号数无关。
+先写到临时文件，完成后再整体替换目标文件，中途失败不会留下半个文件。
+
+所有函数都是阻塞的，在 Home Assistant 中需要放到执行器中调用。
+"""
+
+import csv
+import json
+import os
+from datetime import date
+from typing import Dict, Iterable, Optional, Sequence, TextIO
+
+from .history import BillHistoryStore
+from .records import RECORD_TYPES
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+EXPORT_FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+
+# 每行记录所属的数据键
+RECORD_TYPE_COLUMN = "record_type"
+
+# CSV 表头：数据键加上所有记录类型字段的并集，缺少的字段留空
+CSV_COLUMNS = (RECORD_TYPE_COLUMN,) + tuple(
+    dict.fromkeys(
+        name for record_type in RECORD_TYPES.values() for name in record_type.field_names()
+    )
+)
+
+
+def write_history(
+    store: BillHistoryStore,
+    output: TextIO,
+    fmt: str = FORMAT_CSV,
+    keys: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    header: bool = True,
+) -> Dict[str, int]:
+    """把一个历史库的记录按账期从旧到新写入 output
+
+    Args:
+        store: 账单历史库
+        output: 文本输出流
+        fmt: csv 或 jsonl
+        keys: 要导出的数据键，默认全部
+        start: 起始账期日期（包含），按月的账期视为当月 1 日
+        end: 截止账期日期（包含）
+        header: CSV 是否写表头，多个历史库写入同一文件时只有第一个需要
+
+    Returns:
+        数据键 -> 导出的记录数
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+    writer = None
+    if fmt == FORMAT_CSV:
+        writer = csv.DictWriter(output, CSV_COLUMNS, extrasaction="ignore")
+        if header:
+            writer.writeheader()
+
+    counts: Dict[str, int] = {}
+    for key in keys or RECORD_TYPES:
+        count = 0
+        for record in store.iter_records(key, start, end, newest_first=False):
+            row = {RECORD_TYPE_COLUMN: key, **record.as_dict()}
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                output.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+        counts[key] = count
+    return counts
+
+
+def export_history(
+    stores: Iterable[BillHistoryStore],
+    path: str,
+    fmt: str = FORMAT_CSV,
+    keys: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Dict:
+    """把一个或多个历史库导出到文件
+
+    Args:
+        stores: 账单历史库，依次写入同一文件
+        path: 目标文件路径，所在目录不存在时创建
+        fmt: csv 或 jsonl
+        keys: 要导出的数据键，默认全部
+        start: 起始账期日期（包含）
+        end: 截止账期日期（包含）
+
+    Returns:
+        导出统计：路径、各数据键的记录数和文件大小
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    records = {key: 0 for key in keys or RECORD_TYPES}
+    temp_path = f"{path}.tmp"
+    try:
+        # CSV 使用 utf-8-sig，Excel 打开时中文不会乱码
+        encoding = "utf-8-sig" if fmt == FORMAT_CSV else "utf-8"
+        with open(temp_path, "w", encoding=encoding, newline="") as output:
+            for index, store in enumerate(stores):
+                counts = write_history(
+                    store, output, fmt, keys, start, end, header=index == 0
+                )
+                for key, count in counts.items():
+                    records[key] += count
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return {
+        "path": path,
+        "format": fmt,
+        "records": records,
+        "bytes": os.path.getsize(path),
+    }
@@ -0,0 +1,242 @@
+"""账单历史库
+
+每个用户号一个 SQLite 文件，按账期日期（水费 meter_date，垃圾费和欠费
+bill_date）做主键，每次刷新的结果以 upsert 方式合并进来。网站只返回最近
+一段时间的账单，历史库可以保留更早的记录，并支持按日期范围查询。
+
+账期日期格式不统一（水费是 2024-05-12，垃圾费和欠费是按月的 2024-05），
+写入时另存一列 ISO 格式的 period（按月的账期视为当月 1 日），
+范围查询和排序都使用这一列上的索引。
+
+所有方法都是阻塞的，在 Home Assistant 中需要放到执行器中调用。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional
+
+from .records import HISTORY_DATE_FIELDS, RECORD_TYPES, Record, parse_bill_date
+
+_LOGGER = logging.getLogger(__name__)
+
+# 数据键 -> 账期日期字段
+DATE_FIELDS = {
+    "water_bills": "meter_date",
+    "garbage_fees": "bill_date",
+    "water_arrears": "bill_date",
+    "garbage_arrears": "bill_date",
+}
+
+# 规范化账期日期列（YYYY-MM-DD），无法解析的日期为 NULL
+PERIOD_COLUMN = "period"
+
+_SQL_TYPES = {str: "TEXT", float: "REAL", int: "INTEGER"}
+
+
+def _period(text: str) -> Optional[str]:
+    """账期日期 -> 规范化的 ISO 日期"""
+    period = parse_bill_date(text)
+    return period.isoformat() if period else None
+
+
+def _column_types(record_type) -> Dict[str, str]:
+    """记录字段 -> SQLite 列类型"""
+    annotations = record_type.__annotations__
+    return {
+        name: _SQL_TYPES.get(annotations[name], "TEXT")
+        for name in record_type.field_names()
+    }
+
+
+class BillHistoryStore:
+    """单个用户号的账单历史库"""
+
+    def __init__(self, path: str):
+        """初始化历史库
+
+        Args:
+            path: SQLite 文件路径，首次使用时创建
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库并建表"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            for key, record_type in RECORD_TYPES.items():
+                columns = ", ".join(
+                    f"{name} {sql_type}"
+                    for name, sql_type in _column_types(record_type).items()
+                )
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {key} ({columns}, "
+                    f"{PERIOD_COLUMN} TEXT, "
+                    f"PRIMARY KEY (user_id, {DATE_FIELDS[key]}))"
+                )
+                self._migrate_period(conn, key)
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {key}_period_idx "
+                    f"ON {key} ({PERIOD_COLUMN})"
+                )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _migrate_period(conn: sqlite3.Connection, key: str):
+        """为旧版本创建的表补上 period 列，并删除按原始日期字符串建的索引"""
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({key})")}
+        if PERIOD_COLUMN in columns:
+            return
+
+        date_field = DATE_FIELDS[key]
+        conn.execute(f"ALTER TABLE {key} ADD COLUMN {PERIOD_COLUMN} TEXT")
+        conn.execute(f"DROP INDEX IF EXISTS {key}_date_idx")
+        rows = conn.execute(f"SELECT rowid, {date_field} FROM {key}").fetchall()
+        conn.executemany(
+            f"UPDATE {key} SET {PERIOD_COLUMN} = ? WHERE rowid = ?",
+            ((_period(text), rowid) for rowid, text in rows),
+        )
+        _LOGGER.info(f"账单历史表 {key} 已补充规范化账期列，共 {len(rows)} 行")
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def upsert(self, data: Dict[str, List[Record]]) -> int:
+        """合并一次刷新的结果
+
+        水费账单和垃圾费按账期累积；欠费是当前状态，data 中给出的欠费表
+        先清空再写入，已缴清的欠费不会继续留在库中。
+
+        Args:
+            data: 数据键 -> 记录列表
+
+        Returns:
+            写入的行数
+        """
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            with conn:
+                for key, record_type in RECORD_TYPES.items():
+                    if key not in data:
+                        continue
+                    records = data[key]
+                    if key not in HISTORY_DATE_FIELDS:
+                        # 每个用户号一个库，清空整张表即清空该用户的欠费
+                        conn.execute(f"DELETE FROM {key}")
+                    if not records:
+                        continue
+
+                    names = record_type.field_names()
+                    date_field = DATE_FIELDS[key]
+                    keys = ("user_id", date_field)
+                    columns = names + (PERIOD_COLUMN,)
+                    updates = ", ".join(
+                        f"{name}=excluded.{name}" for name in columns if name not in keys
+                    )
+                    conn.executemany(
+                        f"INSERT INTO {key} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))}) "
+                        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}",
+                        (
+                            tuple(getattr(record, name) for name in names)
+                            + (_period(getattr(record, date_field)),)
+                            for record in records
+                        ),
+                    )
+            written = conn.total_changes - before
+
+        _LOGGER.debug(f"账单历史库 {self.path} 写入 {written} 行")
+        return written
+
+    def iter_records(
+        self,
+        key: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        newest_first: bool = True,
+    ) -> Iterator[Record]:
+        """按账期范围逐条读取记录
+
+        按规范化的账期比较，按月的账期视为当月 1 日，start 和 end 都包含在内；
+        有日期范围时，无法解析日期的记录不返回。生成器逐行读取游标，
+        内存占用与记录总数无关。
+
+        Args:
+            key: 数据键，如 water_bills
+            start: 起始账期日期
+            end: 截止账期日期
+            newest_first: 是否按账期从新到旧排列
+        """
+        record_type = RECORD_TYPES[key]
+        names = record_type.field_names()
+        date_field = DATE_FIELDS[key]
+
+        conditions = []
+        params: List[Any] = []
+        if start:
+            conditions.append(f"{PERIOD_COLUMN} >= ?")
+            params.append(start.isoformat())
+        if end:
+            conditions.append(f"{PERIOD_COLUMN} <= ?")
+            params.append(end.isoformat())
+
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT {', '.join(names)} FROM {key}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {PERIOD_COLUMN} {order}, {date_field} {order}"
+
+        with self._lock:
+            cursor = self._connect().execute(sql, params)
+
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(256)
+            if not rows:
+                return
+            for row in rows:
+                yield record_type(*row)
+
+    def query(
+        self,
+        key: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: Optional[int] = None,
+    ) -> List[Record]:
+        """按账期范围读取记录（从新到旧）"""
+        records = []
+        for record in self.iter_records(key, start, end):
+            if limit is not None and len(records) >= limit:
+                break
+            records.append(record)
+        return records
+
+    def size_bytes(self) -> int:
+        """数据库文件（含 WAL）占用的字节数"""
+        return sum(
+            os.path.getsize(self.path + suffix)
+            for suffix in ("", "-wal", "-shm")
+            if os.path.exists(self.path + suffix)
+        )
+
+    def count(self, key: str) -> int:
+        """记录条数"""
+        with self._lock:
+            return self._connect().execute(f"SELECT COUNT(*) FROM {key}").fetchone()[0]
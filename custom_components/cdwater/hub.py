@@ -0,0 +1,152 @@
+"""集成级别的共享资源
+
+所有配置条目共用一个 CdwaterHub（保存在 hass.data[DOMAIN][DATA_HUB]）：
+
+- 一个 HTTP 连接池，每次查询仍然创建自己的会话，cookie 互不影响
+- 按配置共享的验证码识别器，多个账号只加载一份模板
+- 刷新队列：限制同时进行的查询数，并让相邻查询之间至少间隔一段时间
+- 错开各账号的刷新间隔，避免多个账号同时到期
+"""
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant
+
+from .captcha import CaptchaRecognizer
+from .const import (
+    DOMAIN,
+    DATA_HUB,
+    REFRESH_MAX_CONCURRENT,
+    REFRESH_SPACING_SECONDS,
+    REFRESH_STAGGER_SECONDS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+class CdwaterHub:
+    """所有账号共用的连接池、验证码识别器和刷新队列"""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        max_concurrent: int = REFRESH_MAX_CONCURRENT,
+        spacing: float = REFRESH_SPACING_SECONDS,
+        stagger: float = REFRESH_STAGGER_SECONDS,
+    ):
+        """初始化
+
+        Args:
+            hass: Home Assistant 实例
+            max_concurrent: 同时进行的查询数
+            spacing: 相邻两次查询开始的最小间隔（秒）
+            stagger: 相邻账号首次排定刷新的错开量（秒）
+        """
+        self.hass = hass
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._recognizers: Dict[Tuple, CaptchaRecognizer] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._spacing = spacing
+        self._stagger = stagger
+        self._next_start = 0.0
+        self._entries: List[str] = []
+        self.queued = 0
+        self.queue_wait_total = 0.0
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        """共享的连接池，首次使用时创建"""
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(limit_per_host=4)
+        return self._connector
+
+    def recognizer(self, method: str, **kwargs) -> CaptchaRecognizer:
+        """获取共享的验证码识别器，相同配置只创建一次"""
+        key = (method, tuple(sorted(kwargs.items())))
+        recognizer = self._recognizers.get(key)
+        if recognizer is None:
+            recognizer = self._recognizers[key] = CaptchaRecognizer(method, **kwargs)
+            _LOGGER.debug(f"创建共享验证码识别器: {method}")
+            # 在后台加载模板，第一次刷新不必等待
+            self.hass.async_create_background_task(
+                self._async_warm_up(recognizer), f"{DOMAIN}_{method}_warm_up"
+            )
+        return recognizer
+
+    async def _async_warm_up(self, recognizer: CaptchaRecognizer):
+        """预热识别器，失败时留到第一次识别再重试"""
+        try:
+            await recognizer.async_warm_up()
+        except Exception as err:
+            _LOGGER.warning(f"验证码识别器预热失败: {err}")
+
+    async def async_run(self, fetch: Callable[[], Awaitable[_T]]) -> _T:
+        """在刷新队列中执行一次查询"""
+        self.queued += 1
+        queued_at = time.monotonic()
+        async with self._semaphore:
+            # 先占好开始时间再等待，排队的查询各自错开
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._spacing
+            if start > now:
+                await asyncio.sleep(start - now)
+            self.queue_wait_total += time.monotonic() - queued_at
+            return await fetch()
+
+    def register(self, entry_id: str):
+        """登记配置条目"""
+        if entry_id not in self._entries:
+            self._entries.append(entry_id)
+
+    def unregister(self, entry_id: str) -> bool:
+        """注销配置条目
+
+        Returns:
+            是否已没有配置条目
+        """
+        if entry_id in self._entries:
+            self._entries.remove(entry_id)
+        return not self._entries
+
+    def stagger_offset(self, entry_id: str) -> timedelta:
+        """配置条目首次排定刷新的错开量"""
+        try:
+            index = self._entries.index(entry_id)
+        except ValueError:
+            index = 0
+        return timedelta(seconds=index * self._stagger)
+
+    async def async_close(self):
+        """关闭连接池"""
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+    def as_dict(self) -> Dict:
+        """转换为可序列化的字典"""
+        return {
+            "entries": len(self._entries),
+            "recognizers": [key[0] for key in self._recognizers],
+            "queued": self.queued,
+            "average_queue_wait": (
+                round(self.queue_wait_total / self.queued, 2) if self.queued else None
+            ),
+        }
+
+
+def async_get_hub(hass: HomeAssistant) -> CdwaterHub:
+    """获取共享的 CdwaterHub，不存在时创建"""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    hub = domain_data.get(DATA_HUB)
+    if hub is None:
+        hub = domain_data[DATA_HUB] = CdwaterHub(hass)
+    return hub
@@ -0,0 +1,203 @@
+"""刷新流程耗时统计"""
+
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+# 查询流程的各个阶段
+STAGE_VISIT = "visit"
+STAGE_CAPTCHA_DOWNLOAD = "captcha_download"
+STAGE_RECOGNIZE = "recognize"
+STAGE_SUBMIT = "submit"
+STAGE_PARSE = "parse"
+
+STAGES = (
+    STAGE_VISIT,
+    STAGE_CAPTCHA_DOWNLOAD,
+    STAGE_RECOGNIZE,
+    STAGE_SUBMIT,
+    STAGE_PARSE,
+)
+
+OUTCOME_OK = "ok"
+
+_NULL_SPAN = nullcontext()
+
+
+class FetchTimeline:
+    """一次刷新中每个阶段的耗时记录"""
+
+    def __init__(self):
+        """初始化时间线"""
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.outcome: Optional[str] = None
+        # (尝试序号, 阶段, 耗时, 结果)
+        self.spans: List[tuple] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage: str, attempt: int):
+        """记录一个阶段的耗时，异常时以异常类名作为结果"""
+        start = time.perf_counter()
+        outcome = OUTCOME_OK
+        try:
+            yield
+        except BaseException as err:
+            outcome = type(err).__name__
+            raise
+        finally:
+            self.spans.append((attempt, stage, time.perf_counter() - start, outcome))
+
+    @property
+    def attempts(self) -> int:
+        """尝试次数"""
+        return max((span[0] for span in self.spans), default=0)
+
+    def finish(self, outcome: str):
+        """结束时间线"""
+        self.duration = time.perf_counter() - self._start
+        self.outcome = outcome
+
+    def as_dict(self) -> Dict:
+        """转换为可序列化的字典"""
+        attempt_outcomes: Dict[int, str] = {}
+        for attempt, _stage, _duration, outcome in self.spans:
+            attempt_outcomes[attempt] = outcome
+
+        return {
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "outcome": self.outcome,
+            "attempts": self.attempts,
+            "attempt_outcomes": [attempt_outcomes[a] for a in sorted(attempt_outcomes)],
+            "spans": [
+                {
+                    "attempt": attempt,
+                    "stage": stage,
+                    "duration": round(duration, 4),
+                    "outcome": outcome,
+                }
+                for attempt, stage, duration, outcome in self.spans
+            ],
+        }
+
+
+def stage_span(timeline: Optional[FetchTimeline], stage: str, attempt: int):
+    """获取阶段计时上下文，未启用统计时不做任何事"""
+    if timeline is None:
+        return _NULL_SPAN
+    return timeline.span(stage, attempt)
+
+
+class LatencyHistogram:
+    """滚动窗口内的耗时分布"""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, window: int = 100):
+        """初始化直方图
+
+        Args:
+            window: 保留的最近样本数
+        """
+        self._samples = deque(maxlen=window)
+
+    def add(self, value: float):
+        """添加一个样本（秒）"""
+        self._samples.append(value)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def summary(self) -> Dict:
+        """统计摘要"""
+        if not self._samples:
+            return {"count": 0}
+
+        samples = sorted(self._samples)
+        count = len(samples)
+
+        buckets = {}
+        index = 0
+        for bound in self.BUCKETS:
+            while index < count and samples[index] <= bound:
+                index += 1
+            buckets[f"le_{bound:g}"] = index
+        buckets["inf"] = count
+
+        return {
+            "count": count,
+            "min": round(samples[0], 4),
+            "max": round(samples[-1], 4),
+            "mean": round(sum(samples) / count, 4),
+            "p50": round(samples[(count - 1) // 2], 4),
+            "p95": round(samples[min(count - 1, int(count * 0.95))], 4),
+            "buckets": buckets,
+        }
+
+
+class FetchMetrics:
+    """协调器级别的刷新耗时统计"""
+
+    def __init__(self, enabled: bool = True, window: int = 100, timeline_limit: int = 10):
+        """初始化统计
+
+        Args:
+            enabled: 是否启用统计，关闭时不创建时间线
+            window: 每个直方图保留的样本数
+            timeline_limit: 保留的最近刷新时间线数量
+        """
+        self.enabled = enabled
+        self._window = window
+        self._stages: Dict[str, LatencyHistogram] = {}
+        self._total = LatencyHistogram(window)
+        self._attempts = Counter()
+        self._outcomes = Counter()
+        self._counters = Counter()
+        self._timelines = deque(maxlen=timeline_limit)
+
+    def start_timeline(self) -> Optional[FetchTimeline]:
+        """开始一次刷新的时间线"""
+        if not self.enabled:
+            return None
+        return FetchTimeline()
+
+    def record(self, timeline: Optional[FetchTimeline]):
+        """汇总一次已结束的刷新"""
+        if timeline is None:
+            return
+
+        for _attempt, stage, duration, _outcome in timeline.spans:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = LatencyHistogram(self._window)
+            histogram.add(duration)
+
+        if timeline.duration is not None:
+            self._total.add(timeline.duration)
+        self._attempts[timeline.attempts] += 1
+        self._outcomes[timeline.outcome] += 1
+        self._timelines.append(timeline)
+
+    def increment(self, name: str, amount: int = 1):
+        """累加计数器，不受 enabled 影响"""
+        self._counters[name] += amount
+
+    def stage_summary(self, stage: str) -> Dict:
+        """获取单个阶段的耗时摘要"""
+        histogram = self._stages.get(stage)
+        return histogram.summary() if histogram else {"count": 0}
+
+    def as_dict(self) -> Dict:
+        """转换为可序列化的字典"""
+        return {
+            "enabled": self.enabled,
+            "total": self._total.summary(),
+            "stages": {stage: self.stage_summary(stage) for stage in STAGES},
+            "attempts_per_update": dict(sorted(self._attempts.items())),
+            "outcomes": dict(self._outcomes),
+            "counters": dict(self._counters),
+            "recent_timelines": [timeline.as_dict() for timeline in self._timelines],
+        }
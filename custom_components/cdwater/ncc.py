@@ -0,0 +1,754 @@
+"""NCC 模板匹配识别器
+
+依赖 numpy 和 Pillow，由 captcha.CaptchaRecognizer 在预热时才导入，
+只使用超级鹰或远程识别的用户不会在启动时加载这两个库。
+"""
+
+import asyncio
+import io
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .captcha import TEMPLATES_DIR
+
+# 模板和字符统一缩放到的尺寸（模板原始尺寸约为 28x28）
+GLYPH_SIZE = (28, 28)
+
+# 两次检查模板目录变化的最小间隔（秒）
+TEMPLATE_CHECK_INTERVAL = 60
+
+# 去噪时笔画像素至少需要的相邻笔画像素数（8 邻域），孤立的噪点会被去掉
+DESPECKLE_MIN_NEIGHBORS = 1
+
+# 由 ncc_template_builder.py 编译的原型包，放在模板目录中；
+# 包中记录了编译时用到的模板文件，这些文件不再单独加载
+TEMPLATE_PACK_FILE = "prototypes.npz"
+TEMPLATE_PACK_VERSION = 1
+
+# 原型聚类的最大迭代次数
+PROTOTYPE_ITERATIONS = 10
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class NCCCaptchaRecognizer:
+    """基于NCC算法的验证码识别器"""
+
+    def __init__(
+        self,
+        adaptive_threshold: bool = True,
+        despeckle: bool = True,
+        use_template_pack: bool = True,
+    ):
+        """初始化NCC识别器
+
+        Args:
+            adaptive_threshold: 验证码是否使用 Otsu 自适应阈值，否则使用固定阈值 127
+            despeckle: 验证码二值化后是否去除孤立噪点
+            use_template_pack: 是否加载模板目录中的原型包，否则只使用模板文件
+        """
+        self.adaptive_threshold = adaptive_threshold
+        self.despeckle = despeckle
+        self.use_template_pack = use_template_pack
+        self._templates = {}
+        self._templates_dir = TEMPLATES_DIR
+        self._confidence_threshold = 0.35
+        self._templates_loaded = False
+        # 已加载的模板文件: 文件名 -> (字符, 二值图像, 模板向量)
+        self._template_files: Dict[str, Tuple[str, np.ndarray, np.ndarray]] = {}
+        # 原型包中的原型: 键 -> (字符, None, 原型向量)，以及包覆盖的模板文件
+        self._pack_entries: Dict[str, Tuple[str, None, np.ndarray]] = {}
+        self._pack_sources: frozenset = frozenset()
+        self._pack_signature: Optional[Tuple[int, int]] = None
+        # 包覆盖的模板文件被删除后原型包即过期，改用剩余的模板文件
+        self._pack_stale = False
+        # 全部模板向量组成的矩阵和每行对应的字符，作为一个整体替换
+        self._template_bank: Optional[Tuple[np.ndarray, List[str]]] = None
+        # 模板目录的修改时间，用于低成本地发现文件增删
+        self._templates_dir_mtime: Optional[int] = None
+        self._last_template_check = 0.0
+        self._template_lock = asyncio.Lock()
+        self.template_reloads = 0
+        # 后台预热任务，首次识别时如果还没完成就等待它
+        self._warm_up_task: Optional[asyncio.Future] = None
+        self.warm_up_seconds: Optional[float] = None
+
+    async def async_warm_up(self):
+        """在后台预先加载模板
+
+        并发调用共用同一次加载；加载失败后下次调用会重新加载。
+        """
+        if self._templates_loaded:
+            return
+
+        if self._warm_up_task is None:
+            self._warm_up_task = asyncio.ensure_future(self._timed_load_templates())
+        try:
+            await asyncio.shield(self._warm_up_task)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._warm_up_task = None
+            raise
+        self._templates_loaded = True
+
+    async def _timed_load_templates(self):
+        """加载模板并记录耗时"""
+        start = time.perf_counter()
+        async with self._template_lock:
+            await self._sync_templates()
+        self.warm_up_seconds = time.perf_counter() - start
+        _LOGGER.debug(f"模板加载耗时 {self.warm_up_seconds:.3f} 秒")
+
+    async def async_check_templates(self, force: bool = False) -> bool:
+        """检查模板目录是否有文件增删，有则增量更新模板库
+
+        目录修改时间没变时只做一次 stat；变化时只解码新增的文件、移除已删除
+        的文件，再用缓存的模板向量重建矩阵。两次检查至少间隔
+        TEMPLATE_CHECK_INTERVAL 秒，除非 force 为 True。
+
+        Returns:
+            模板库是否发生变化
+        """
+        if not self._templates_loaded:
+            await self.async_warm_up()
+            return False
+
+        now = time.monotonic()
+        if not force and now - self._last_template_check < TEMPLATE_CHECK_INTERVAL:
+            return False
+        self._last_template_check = now
+
+        loop = asyncio.get_running_loop()
+        async with self._template_lock:
+            try:
+                mtime = await loop.run_in_executor(None, self._read_templates_dir_mtime)
+                if mtime == self._templates_dir_mtime:
+                    return False
+                return await self._sync_templates()
+            except Exception as e:
+                # 更新失败时继续使用原来的模板库
+                _LOGGER.warning(f"更新模板库失败: {e}")
+                return False
+
+    def _read_templates_dir_mtime(self) -> Optional[int]:
+        """读取模板目录的修改时间（阻塞），目录不存在时返回 None"""
+        try:
+            return os.stat(self._templates_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read_pack_signature(self) -> Optional[Tuple[int, int]]:
+        """读取原型包的修改时间和大小（阻塞），不存在或不使用原型包时返回 None"""
+        if not self.use_template_pack:
+            return None
+        try:
+            stat = os.stat(os.path.join(self._templates_dir, TEMPLATE_PACK_FILE))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_template_pack(self):
+        """读取原型包（阻塞）
+
+        Returns:
+            (原型, 包覆盖的模板文件名)，无法使用时返回 None
+        """
+        path = os.path.join(self._templates_dir, TEMPLATE_PACK_FILE)
+        try:
+            with np.load(path, allow_pickle=False) as pack:
+                if int(pack["version"]) != TEMPLATE_PACK_VERSION:
+                    _LOGGER.warning(f"原型包版本不兼容，忽略: {path}")
+                    return None
+                if bool(pack["despeckle"]) != self.despeckle:
+                    _LOGGER.warning(f"原型包的去噪设置与识别器不一致，忽略: {path}")
+                    return None
+                vectors = pack["vectors"].astype(np.float32)
+                chars = pack["chars"].tolist()
+                sources = frozenset(pack["sources"].tolist())
+        except (OSError, KeyError, ValueError) as e:
+            _LOGGER.warning(f"无法加载原型包 {path}: {e}")
+            return None
+
+        entries = {
+            f"{TEMPLATE_PACK_FILE}#{index}": (char_name, None, vector)
+            for index, (char_name, vector) in enumerate(zip(chars, vectors))
+        }
+        return entries, sources
+
+    def _load_single_template(self, filename: str):
+        """加载单个模板文件（阻塞）
+
+        Returns:
+            (字符, 二值图像, 模板向量)，不是模板或无法读取时返回 None
+        """
+        if not filename.endswith(".png"):
+            return None
+
+        # 模板文件名格式: char_name_uuid.png
+        parts = os.path.splitext(filename)[0].split("_")
+        if len(parts) < 2:
+            return None
+
+        char_name = parts[0]
+        template_path = os.path.join(self._templates_dir, filename)
+        try:
+            with open(template_path, "rb") as f:
+                img = Image.open(f)
+                img.load()  # 确保图片数据被加载
+                template_binary = self._get_binary_image(img)
+                if template_binary is not None and self.despeckle:
+                    template_binary = self._despeckle_template(template_binary)
+                if template_binary is not None:
+                    return (
+                        char_name,
+                        template_binary,
+                        self._glyph_vector(template_binary, inverse=False),
+                    )
+        except Exception as e:
+            _LOGGER.warning(f"无法加载模板文件 {template_path}: {e}")
+        return None
+
+    async def _sync_templates(self) -> bool:
+        """把模板目录同步到内存中的模板库
+
+        首次调用加载全部文件；之后只加载新增的文件并移除已删除的文件，
+        未变化的文件不会重新读取。调用方需持有 _template_lock。
+
+        Returns:
+            模板库是否发生变化
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def scan_templates_dir():
+            """在线程中读取目录修改时间、文件列表和原型包签名"""
+            mtime = self._read_templates_dir_mtime()
+            if mtime is None:
+                _LOGGER.warning(f"模板目录不存在: {self._templates_dir}")
+                return None, [], None
+            try:
+                return mtime, os.listdir(self._templates_dir), self._read_pack_signature()
+            except OSError as e:
+                _LOGGER.error(f"无法读取模板目录 {self._templates_dir}: {e}")
+                return None, [], None
+
+        loop = asyncio.get_running_loop()
+        mtime, filenames, pack_signature = await loop.run_in_executor(
+            None, scan_templates_dir
+        )
+
+        # 原型包只在重新编译（签名变化）时重新读取
+        pack_entries, pack_sources = self._pack_entries, self._pack_sources
+        pack_changed = pack_signature != self._pack_signature
+        if pack_changed:
+            pack = None
+            if pack_signature is not None:
+                pack = await loop.run_in_executor(None, self._load_template_pack)
+            pack_entries, pack_sources = pack or ({}, frozenset())
+
+        # 原型包编译后又删除了其中的模板文件，说明包已过期，
+        # 整个包都不再使用，改为加载目录中剩余的模板文件，直到重新编译
+        missing = pack_sources.difference(filenames)
+        pack_stale = bool(missing)
+        if pack_stale and (pack_changed or not self._pack_stale):
+            _LOGGER.warning(
+                f"原型包中的 {len(missing)} 个模板文件已被删除，原型包已过期，"
+                f"改用模板文件，请重新编译原型包"
+            )
+        active_entries, active_sources = (
+            ({}, frozenset()) if pack_stale else (pack_entries, pack_sources)
+        )
+
+        # 已编入原型包的模板文件不再单独加载
+        names = {name for name in filenames if name not in active_sources}
+        added = sorted(names - self._template_files.keys())
+        removed = [name for name in self._template_files if name not in names]
+
+        # 使用线程池异步加载新增的模板
+        results = []
+        if added:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                tasks = [
+                    loop.run_in_executor(executor, self._load_single_template, filename)
+                    for filename in added
+                ]
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        template_files = {
+            name: entry
+            for name, entry in self._template_files.items()
+            if name not in removed
+        }
+        added_count = 0
+        for filename, result in zip(added, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning(f"加载模板时出现异常: {result}")
+                continue
+            if result is not None:
+                template_files[filename] = result
+                added_count += 1
+
+        self._templates_dir_mtime = mtime
+        self._pack_signature = pack_signature
+        changed = (
+            added_count > 0
+            or len(removed) > 0
+            or pack_changed
+            or pack_stale != self._pack_stale
+        )
+        if not changed and self._template_bank is not None:
+            return False
+
+        entries = {**active_entries, **template_files}
+        bank = await loop.run_in_executor(None, self._build_template_bank, entries)
+
+        templates: Dict[str, List[Optional[np.ndarray]]] = {}
+        for char_name, template_binary, _vector in entries.values():
+            templates.setdefault(char_name, []).append(template_binary)
+
+        # 识别可能正在线程中进行，模板库整体替换而不是原地修改
+        self._template_files = template_files
+        self._pack_entries = pack_entries
+        self._pack_sources = pack_sources
+        self._pack_stale = pack_stale
+        self._templates = templates
+        self._template_bank = bank
+
+        if self._templates_loaded:
+            self.template_reloads += 1
+            _LOGGER.info(
+                f"模板库已更新: 新增 {added_count} 个，移除 {len(removed)} 个，"
+                f"共 {len(template_files)} 个模板、{len(active_entries)} 个原型"
+            )
+        else:
+            _LOGGER.info(
+                f"加载了 {len(template_files)} 个模板、{len(active_entries)} 个原型，"
+                f"覆盖 {len(templates)} 个字符"
+            )
+        return changed
+
+    def _get_binary_image(self, pil_image, threshold=127):
+        """将PIL图片转换为二值化numpy数组"""
+        img_gray = pil_image.convert("L")
+        img_array = np.array(img_gray)
+        binary_img = (img_array < threshold).astype(np.uint8)
+        return binary_img
+
+    def _binarize_captcha(self, pil_image):
+        """验证码二值化：自适应阈值，再去除孤立噪点
+
+        对比度和抗锯齿程度不同的验证码用固定阈值会丢笔画或引入噪点，
+        这里按每张图片的灰度直方图选阈值。
+        """
+        img_array = np.asarray(pil_image.convert("L"))
+        threshold = _otsu_threshold(img_array) + 1 if self.adaptive_threshold else 127
+        binary_img = (img_array < threshold).astype(np.uint8)
+        if self.despeckle:
+            binary_img = _despeckle(binary_img)
+        return binary_img
+
+    def _despeckle_template(self, binary_img):
+        """模板去噪并裁剪到笔画范围
+
+        模板截取自真实验证码，带有同样的噪点；和验证码使用同样的去噪，
+        两者的边界框才一致。模板是黑底白字，二值化后笔画为 0。
+        """
+        strokes = _despeckle(1 - binary_img)
+        coords = np.argwhere(strokes > 0)
+        if coords.size == 0:
+            return binary_img
+        y1, x1 = coords.min(axis=0)
+        y2, x2 = coords.max(axis=0)
+        return 1 - strokes[y1 : y2 + 1, x1 : x2 + 1]
+
+    def _glyph_vector(self, binary_img, inverse: bool):
+        """把字符图像缩放到统一尺寸，展开为零均值、单位长度的向量
+
+        模板和待识别字符的极性相反，待识别字符缩放后取反，两者才能直接比较。
+        """
+        resized = np.array(
+            Image.fromarray(binary_img * 255).resize(GLYPH_SIZE, Image.LANCZOS)
+        )
+        binary = resized < 127 if inverse else resized >= 127
+        vector = binary.astype(np.float32).ravel()
+        vector -= vector.mean()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _build_template_bank(
+        self, template_files: Dict[str, Tuple[str, Optional[np.ndarray], np.ndarray]]
+    ) -> Tuple[np.ndarray, List[str]]:
+        """把模板向量堆成一个矩阵，每行一个模板（阻塞）
+
+        Returns:
+            (模板矩阵, 每行对应的字符)
+        """
+        chars = []
+        rows = []
+        for filename in sorted(template_files):
+            char_name, _binary, vector = template_files[filename]
+            chars.append(char_name)
+            rows.append(vector)
+        matrix = (
+            np.stack(rows) if rows else np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+        )
+        return matrix, chars
+
+    def _segment_by_center(self, binary_img):
+        """使用图片中线进行分割"""
+        height, width = binary_img.shape
+        mid_point = width // 2
+
+        char1_img = binary_img[:, :mid_point]
+        char2_img = binary_img[:, mid_point:]
+
+        # 简单检查分割后的区域是否包含字符像素
+        if np.sum(char1_img) == 0 or np.sum(char2_img) == 0:
+            return []
+
+        # 找到每个分割区域的精确边界框
+        def get_bbox(segment):
+            coords = np.argwhere(segment > 0)
+            if coords.size == 0:
+                return None
+            y1, x1 = coords.min(axis=0)
+            y2, x2 = coords.max(axis=0)
+            return (x1, y1, x2, y2)
+
+        box1 = get_bbox(char1_img)
+        box2 = get_bbox(char2_img)
+
+        if box1 and box2:
+            return [
+                (box1[0], box1[1], box1[2], box1[3]),
+                (box2[0] + mid_point, box2[1], box2[2] + mid_point, box2[3]),
+            ]
+
+        return []
+
+    def _extract_char_images(self, binary_img, bboxes):
+        """根据边界框提取单个字符图像"""
+        char_images = []
+        for x1, y1, x2, y2 in bboxes:
+            char_img = binary_img[y1 : y2 + 1, x1 : x2 + 1]
+            char_images.append(char_img)
+        return char_images
+
+    async def recognize(self, image_data: bytes) -> Tuple[str, float]:
+        """识别验证码
+
+        Args:
+            image_data: 验证码图片的二进制数据
+
+        Returns:
+            (识别结果, 平均置信度)
+        """
+        # 确保模板已加载，预热未完成时等待预热结果；之后定期检查模板目录
+        await self.async_check_templates()
+
+        # 解码、二值化和打分都是 CPU 密集的，放到线程中执行，不阻塞事件循环
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, self._recognize_batch, [image_data])
+        result = results[0]
+        if isinstance(result, Exception):
+            _LOGGER.error(f"NCC验证码识别失败: {result}")
+            raise result
+        return result
+
+    async def recognize_many(
+        self, images: List[bytes]
+    ) -> List[Union[Tuple[str, float], Exception]]:
+        """批量识别验证码
+
+        所有图片的字符合在一起用一次矩阵乘法打分，在线程中执行。
+
+        Args:
+            images: 验证码图片的二进制数据列表
+
+        Returns:
+            与 images 一一对应的 (识别结果, 平均置信度)，失败的位置为异常
+        """
+        if not images:
+            return []
+        await self.async_check_templates()
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._recognize_batch, list(images))
+
+    def _split_glyphs(self, image_data: bytes) -> List:
+        """二值化并分割出两个字符图像"""
+        img = Image.open(io.BytesIO(image_data))
+        binary_img = self._binarize_captcha(img)
+
+        bboxes = self._segment_by_center(binary_img)
+        if len(bboxes) != 2:
+            raise RuntimeError("无法正确分割验证码图片")
+        return self._extract_char_images(binary_img, bboxes)
+
+    def _recognize_batch(
+        self, images: List[bytes]
+    ) -> List[Union[Tuple[str, float], Exception]]:
+        """批量识别（阻塞）
+
+        先分割全部图片，再用一次矩阵乘法计算所有字符与所有模板的 NCC。
+        模板必须已经加载。
+
+        Returns:
+            与 images 一一对应的 (识别结果, 平均置信度)，失败的位置为异常
+        """
+        bank = self._template_bank
+        if bank is None or not bank[1]:
+            return [RuntimeError("没有可用的模板文件") for _ in images]
+        template_matrix, template_chars = bank
+
+        results: List = [None] * len(images)
+        vectors = []
+        owners = []
+        for index, image_data in enumerate(images):
+            try:
+                glyphs = self._split_glyphs(image_data)
+            except Exception as e:
+                results[index] = e
+                continue
+            for glyph in glyphs:
+                vectors.append(self._glyph_vector(glyph, inverse=True))
+                owners.append(index)
+
+        if vectors:
+            # (字符数 x 向量长度) @ (向量长度 x 模板数)，向量已归一化，乘积即 NCC
+            scores = np.stack(vectors) @ template_matrix.T
+            best = scores.argmax(axis=1)
+            best_scores = scores[np.arange(len(best)), best]
+
+            texts: Dict[int, str] = {}
+            confidences: Dict[int, List[float]] = {}
+            for owner, template_index, score in zip(owners, best, best_scores):
+                texts[owner] = texts.get(owner, "") + template_chars[template_index]
+                confidences.setdefault(owner, []).append(float(score))
+
+            for owner, text in texts.items():
+                scores_of_image = confidences[owner]
+                avg_confidence = sum(scores_of_image) / len(scores_of_image)
+                _LOGGER.debug(
+                    f"NCC识别结果: {text}, 置信度: {scores_of_image}, 平均: {avg_confidence:.3f}"
+                )
+                results[owner] = (text, avg_confidence)
+
+        return results
+
+    def stats(self) -> Dict:
+        """模板库统计"""
+        templates = [t for template_list in self._templates.values() for t in template_list]
+        return {
+            "templates_loaded": self._templates_loaded,
+            "characters": len(self._templates),
+            "templates": len(self._template_files),
+            "prototypes": 0 if self._pack_stale else len(self._pack_entries),
+            "template_pack_stale": self._pack_stale,
+            "template_bytes": sum(t.nbytes for t in templates if t is not None)
+            + (self._template_bank[0].nbytes if self._template_bank is not None else 0),
+            "template_reloads": self.template_reloads,
+            "warm_up_seconds": (
+                round(self.warm_up_seconds, 4) if self.warm_up_seconds is not None else None
+            ),
+        }
+
+    def is_available(self) -> bool:
+        """检查识别器是否可用"""
+        # 如果模板还没加载，简单检查模板目录是否存在
+        if not self._templates_loaded:
+            return os.path.exists(self._templates_dir)
+        return len(self._templates) > 0
+
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    """Otsu 阈值：使两类像素类间方差最大的灰度级
+
+    用直方图的累计和一次算出全部 256 个候选阈值的类间方差。
+
+    Args:
+        gray: uint8 灰度图像
+
+    Returns:
+        阈值，灰度不大于它的像素为一类
+    """
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight0 = np.cumsum(hist)
+    weight1 = weight0[-1] - weight0
+    level_sum = np.cumsum(hist * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean0 = level_sum / weight0
+        mean1 = (level_sum[-1] - level_sum) / weight1
+        variance = weight0 * weight1 * (mean0 - mean1) ** 2
+    return int(np.nan_to_num(variance).argmax())
+
+
+def _despeckle(binary_img: np.ndarray, min_neighbors: int = DESPECKLE_MIN_NEIGHBORS) -> np.ndarray:
+    """去掉 8 邻域内笔画像素少于 min_neighbors 个的像素
+
+    Args:
+        binary_img: 笔画为 1 的二值图像
+
+    Returns:
+        去噪后的二值图像
+    """
+    padded = np.pad(binary_img, 1)
+    height, width = binary_img.shape
+    neighbors = sum(
+        padded[1 + dy : 1 + dy + height, 1 + dx : 1 + dx + width]
+        for dy in (-1, 0, 1)
+        for dx in (-1, 0, 1)
+        if dy or dx
+    )
+    return binary_img & (neighbors >= min_neighbors)
+
+
+def _augment_strokes(strokes: np.ndarray) -> List[np.ndarray]:
+    """生成一个字符的受控变体：原图、上下左右各平移 1 像素、笔画加粗和变细
+
+    字符识别前会裁剪到笔画边界再缩放，平移通过在一侧补一行或一列空白实现。
+
+    Args:
+        strokes: 笔画为 1 的二值图像
+
+    Returns:
+        变体列表（第一个为原图）
+    """
+    variants = [strokes]
+    for padding in (((1, 0), (0, 0)), ((0, 1), (0, 0)), ((0, 0), (1, 0)), ((0, 0), (0, 1))):
+        variants.append(np.pad(strokes, padding))
+
+    padded = np.pad(strokes, 1)
+    height, width = strokes.shape
+    cross = [
+        padded[1 + dy : 1 + dy + height, 1 + dx : 1 + dx + width]
+        for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1))
+    ]
+    dilated = strokes.copy()
+    eroded = strokes.copy()
+    for shifted in cross:
+        dilated |= shifted
+        eroded &= shifted
+    variants.append(dilated)
+    # 细笔画变细后可能几乎消失，这种变体没有意义
+    if eroded.sum() * 3 >= strokes.sum():
+        variants.append(eroded)
+    return variants
+
+
+def _cluster_prototypes(vectors: np.ndarray, initial: np.ndarray) -> np.ndarray:
+    """球面 k-means：以原始模板为初始中心，把变体聚成同样数量的原型
+
+    Args:
+        vectors: 变体向量（零均值、单位长度），每行一个
+        initial: 初始中心，每行一个
+
+    Returns:
+        原型向量，行数与 initial 相同
+    """
+    centroids = initial.copy()
+    for _ in range(PROTOTYPE_ITERATIONS):
+        labels = (vectors @ centroids.T).argmax(axis=1)
+        updated = centroids.copy()
+        for index in range(len(centroids)):
+            members = vectors[labels == index]
+            if not len(members):
+                continue
+            centroid = members.mean(axis=0)
+            centroid -= centroid.mean()
+            norm = np.linalg.norm(centroid)
+            if norm:
+                updated[index] = centroid / norm
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    return centroids
+
+
+def build_prototypes(
+    recognizer: NCCCaptchaRecognizer, templates: Dict[str, List[np.ndarray]]
+) -> Tuple[np.ndarray, List[str]]:
+    """为每个字符生成变体并聚类为原型（阻塞）
+
+    每个字符的原型数等于它的模板数，匹配矩阵的大小不变。
+
+    Args:
+        recognizer: 提供预处理方法的识别器
+        templates: 字符 -> 模板二值图像列表（模板极性，笔画为 0）
+
+    Returns:
+        (原型矩阵, 每行对应的字符)
+    """
+    chars: List[str] = []
+    rows = []
+    for char_name in sorted(templates):
+        binaries = templates[char_name]
+        initial = np.stack([recognizer._glyph_vector(b, inverse=False) for b in binaries])
+        variants = np.stack(
+            [
+                recognizer._glyph_vector(1 - variant, inverse=False)
+                for binary in binaries
+                for variant in _augment_strokes(1 - binary)
+            ]
+        )
+        rows.append(_cluster_prototypes(variants, initial))
+        chars.extend([char_name] * len(binaries))
+    matrix = (
+        np.concatenate(rows) if rows else np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+    )
+    return matrix.astype(np.float32), chars
+
+
+def compile_template_pack(templates_dir: str = TEMPLATES_DIR, despeckle: bool = True) -> Dict:
+    """把模板目录中的 PNG 模板编译为原型包（阻塞）
+
+    原型包写入模板目录，运行中的识别器会在下一次检查模板目录时加载它。
+
+    Args:
+        templates_dir: 模板目录
+        despeckle: 与识别器的去噪设置一致
+
+    Returns:
+        编译统计
+    """
+    recognizer = NCCCaptchaRecognizer(despeckle=despeckle)
+    recognizer._templates_dir = templates_dir
+
+    sources: List[str] = []
+    templates: Dict[str, List[np.ndarray]] = {}
+    for filename in sorted(os.listdir(templates_dir)):
+        entry = recognizer._load_single_template(filename)
+        if entry is None:
+            continue
+        char_name, template_binary, _vector = entry
+        sources.append(filename)
+        templates.setdefault(char_name, []).append(template_binary)
+
+    matrix, chars = build_prototypes(recognizer, templates)
+
+    path = os.path.join(templates_dir, TEMPLATE_PACK_FILE)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        np.savez_compressed(
+            file,
+            version=np.int64(TEMPLATE_PACK_VERSION),
+            despeckle=np.bool_(despeckle),
+            vectors=matrix,
+            chars=np.array(chars),
+            sources=np.array(sources),
+        )
+    # 整体替换，识别器不会读到写了一半的文件
+    os.replace(temp_path, path)
+
+    return {
+        "path": path,
+        "templates": len(sources),
+        "characters": len(templates),
+        "prototypes": len(chars),
+        "bytes": os.path.getsize(path),
+    }
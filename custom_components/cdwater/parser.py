@@ -0,0 +1,367 @@
+"""查询响应解析器
+
+响应格式为 ``状态码w|f内容``：状态码为 1 时内容是包含四个表格的 HTML
+（水费账单、垃圾处理费、水费欠费、垃圾处理费欠费），否则内容是失败原因。
+解析器一次扫描 HTML，遇到行结束就直接转换为账单记录，不生成中间表格。
+"""
+
+import html
+import logging
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .exceptions import (
+    CdwaterError,
+    CaptchaRejectedError,
+    SessionExpiredError,
+    ServerError,
+    ParseError,
+    InvalidAccountError,
+)
+from .records import WaterBill, GarbageFee, Arrear
+
+_LOGGER = logging.getLogger(__name__)
+
+# 可选依赖，对不规范的 HTML 容错性更好；只在使用时才导入
+_lxml_html = None
+
+RESPONSE_SEPARATOR = "w|f"
+STATUS_SUCCESS = "1"
+
+# 查询失败原因中的关键字，用于区分错误类型
+INVALID_ACCOUNT_KEYWORDS = ("户号", "用户号", "用户不存在", "无此用户")
+SESSION_EXPIRED_KEYWORDS = ("会话", "过期", "超时", "session")
+
+# 表格顺序
+TABLE_WATER_BILLS = 0
+TABLE_GARBAGE_FEES = 1
+TABLE_WATER_ARREARS = 2
+TABLE_GARBAGE_ARREARS = 3
+
+# 各表格第二列都是账期日期
+DATE_COLUMN = 1
+
+_TAG_RE = re.compile(r"<(/?)(table|tr|td|th)\b[^>]*>", re.IGNORECASE)
+_TABLE_END_RE = re.compile(r"</table\s*>", re.IGNORECASE)
+_INNER_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def classify_query_error(status_code: str, reason: str) -> CdwaterError:
+    """根据查询失败原因构造对应的异常"""
+    message = f"查询失败，状态码: {status_code}, 原因: {reason}"
+
+    if "验证码" in reason:
+        return CaptchaRejectedError(message)
+    if any(keyword in reason for keyword in INVALID_ACCOUNT_KEYWORDS):
+        return InvalidAccountError(message)
+    if any(keyword in reason for keyword in SESSION_EXPIRED_KEYWORDS):
+        return SessionExpiredError(message)
+    return ServerError(message)
+
+
+def _clean_cell(raw: str) -> str:
+    """将单元格原始 HTML 转换为纯文本"""
+    if "<" in raw:
+        raw = _INNER_TAG_RE.sub("", raw)
+    if "&" in raw:
+        raw = raw.replace("&nbsp;", "")
+        if "&" in raw:
+            raw = html.unescape(raw)
+    return raw.replace("\xa0", "").strip()
+
+
+def _to_float(text: str) -> float:
+    """安全转换为浮点数"""
+    try:
+        return float(text) if text else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _to_int(text: str) -> int:
+    """安全转换为整数"""
+    try:
+        return int(text) if text else 0
+    except ValueError:
+        return 0
+
+
+def _water_bill(row: List[str]) -> Optional[WaterBill]:
+    """水费账单行"""
+    if len(row) < 14:
+        return None
+    return WaterBill(
+        user_id=row[0],
+        meter_date=row[1],
+        previous_reading=_to_float(row[2]),
+        current_reading=_to_float(row[3]),
+        usage=_to_float(row[4]),
+        unit_price=_to_float(row[5]),
+        amount_due=_to_float(row[6]),
+        amount_paid=_to_float(row[7]),
+        previous_balance=_to_float(row[8]),
+        current_balance=_to_float(row[9]),
+        penalty_due=_to_float(row[10]),
+        penalty_paid=_to_float(row[11]),
+        payment_date=row[12],
+        payment_status=row[13],
+    )
+
+
+def _garbage_fee(row: List[str]) -> Optional[GarbageFee]:
+    """垃圾处理费行"""
+    if len(row) < 8:
+        return None
+    return GarbageFee(
+        user_id=row[0],
+        bill_date=row[1],
+        unit_price=_to_float(row[2]),
+        period_months=_to_int(row[3]),
+        amount_due=_to_float(row[4]),
+        amount_paid=_to_float(row[5]),
+        payment_date=row[6],
+        payment_status=row[7],
+    )
+
+
+def _garbage_arrear(row: List[str]) -> Optional[Arrear]:
+    """垃圾处理费欠费行"""
+    if len(row) < 7:
+        return None
+    return Arrear(
+        user_id=row[0],
+        bill_date=row[1],
+        unit_price=_to_float(row[2]),
+        period_months=_to_int(row[3]),
+        amount_due=_to_float(row[4]),
+        amount_paid=_to_float(row[5]),
+        payment_status=row[6],
+    )
+
+
+# 表格序号 -> (结果键, 行转换函数)；水费欠费表格式未知，暂不解析
+_TABLES: Dict[int, Tuple[str, Callable[[List[str]], Optional[object]]]] = {
+    TABLE_WATER_BILLS: ("water_bills", _water_bill),
+    TABLE_GARBAGE_FEES: ("garbage_fees", _garbage_fee),
+    TABLE_GARBAGE_ARREARS: ("garbage_arrears", _garbage_arrear),
+}
+
+
+def _iter_rows_regex(
+    content: str, stop_at: Optional[Dict[int, str]] = None
+) -> Iterator[Tuple[int, int, List[str]]]:
+    """扫描 HTML，逐行产出 (表格序号, 行序号, 单元格文本)
+
+    与按标签回调的 HTMLParser 行为一致：空行和空表格不计入序号，
+    嵌套表格不单独计数。
+
+    Args:
+        content: HTML 内容
+        stop_at: 表格序号 -> 日期；产出日期列等于该值的行后直接跳到表格末尾
+    """
+    table_index = 0
+    row_index = 0
+    in_table = False
+    row: Optional[List[str]] = None
+    cell_start = -1
+    position = 0
+
+    while True:
+        match = _TAG_RE.search(content, position)
+        if match is None:
+            return
+        position = match.end()
+        closing, tag = match.group(1), match.group(2).lower()
+
+        if tag == "table":
+            if not closing:
+                in_table = True
+                row_index = 0
+            elif in_table:
+                if row_index:
+                    table_index += 1
+                in_table = False
+                row = None
+                cell_start = -1
+
+        elif tag == "tr":
+            if not closing:
+                if in_table:
+                    row = []
+                    cell_start = -1
+            elif row is not None:
+                if row:
+                    yield table_index, row_index, row
+                    row_index += 1
+                    if (
+                        stop_at
+                        and row_index > 1
+                        and len(row) > DATE_COLUMN
+                        and stop_at.get(table_index) == row[DATE_COLUMN]
+                    ):
+                        # 余下的都是已知账期，跳过不再扫描
+                        table_end = _TABLE_END_RE.search(content, position)
+                        if table_end is not None:
+                            position = table_end.start()
+                row = None
+                cell_start = -1
+
+        elif row is not None:
+            if not closing:
+                cell_start = match.end()
+            elif cell_start >= 0:
+                row.append(_clean_cell(content[cell_start : match.start()]))
+                cell_start = -1
+
+
+def _load_lxml() -> bool:
+    """导入 lxml，返回是否可用"""
+    global _lxml_html
+    if _lxml_html is None:
+        try:
+            from lxml import html as lxml_html
+        except ImportError:  # pragma: no cover - 取决于运行环境
+            return False
+        _lxml_html = lxml_html
+    return True
+
+
+def _iter_rows_lxml(
+    content: str, stop_at: Optional[Dict[int, str]] = None
+) -> Iterator[Tuple[int, int, List[str]]]:
+    """使用 lxml 解析 HTML，产出格式和参数同 _iter_rows_regex"""
+    root = _lxml_html.fragment_fromstring(content, create_parent="div")
+    table_index = 0
+
+    for table in root.iter("table"):
+        row_index = 0
+        stop_value = stop_at.get(table_index) if stop_at else None
+        for tr in table.iter("tr"):
+            row = [
+                cell.text_content().replace("\xa0", "").strip()
+                for cell in tr
+                if cell.tag in ("td", "th")
+            ]
+            if row:
+                yield table_index, row_index, row
+                row_index += 1
+                if (
+                    stop_value is not None
+                    and row_index > 1
+                    and len(row) > DATE_COLUMN
+                    and row[DATE_COLUMN] == stop_value
+                ):
+                    break
+        if row_index:
+            table_index += 1
+
+
+def parse_tables(
+    content: str,
+    use_lxml: bool = False,
+    watermarks: Optional[Dict[str, str]] = None,
+) -> Dict[str, List]:
+    """将 HTML 内容解析为账单记录
+
+    Args:
+        content: 响应中的 HTML 部分
+        use_lxml: 是否使用 lxml 解析，默认使用更快的正则扫描
+        watermarks: 结果键 -> 已知最新账期日期（水费为 meter_date，
+            垃圾费为 bill_date）。给出后只产出比它新的行以及该账期本身
+            （缴费状态可能已变化），更早的行不再解析。
+
+    Returns:
+        按结果键分组的记录列表
+    """
+    if use_lxml and not _load_lxml():
+        _LOGGER.debug("lxml 未安装，使用正则扫描解析")
+        use_lxml = False
+
+    result: Dict[str, List] = {
+        "water_bills": [],
+        "garbage_fees": [],
+        "water_arrears": [],
+        "garbage_arrears": [],
+    }
+
+    if not content.strip():
+        return result
+
+    stop_at = None
+    if watermarks:
+        stop_at = {
+            table_index: watermarks[key]
+            for table_index, (key, _convert) in _TABLES.items()
+            if watermarks.get(key)
+        }
+
+    if use_lxml:
+        rows = _iter_rows_lxml(content, stop_at)
+    else:
+        rows = _iter_rows_regex(content, stop_at)
+
+    for table_index, row_index, row in rows:
+        # 每个表格第一行是表头
+        if row_index == 0:
+            continue
+        table = _TABLES.get(table_index)
+        if table is None:
+            continue
+        key, convert = table
+        record = convert(row)
+        if record is not None:
+            result[key].append(record)
+
+    return result
+
+
+def parse_response(
+    response_text: str,
+    use_lxml: bool = False,
+    watermarks: Optional[Dict[str, str]] = None,
+) -> Dict:
+    """解析查询响应
+
+    Args:
+        response_text: 查询接口返回的原始文本
+        use_lxml: 是否使用 lxml 解析，默认使用更快的正则扫描
+        watermarks: 已知最新账期，见 parse_tables
+
+    Returns:
+        解析后的账单数据。给出 watermarks 时 incremental 为 True，
+        数据是否变化由协调器合并时判断
+
+    Raises:
+        CdwaterError: 查询被服务器拒绝或响应无法解析
+    """
+    _LOGGER.debug(f"开始解析响应数据，响应长度: {len(response_text)}")
+
+    status_code, separator, content = response_text.partition(RESPONSE_SEPARATOR)
+    status_code = status_code.strip()
+
+    if status_code != STATUS_SUCCESS:
+        if not separator:
+            _LOGGER.debug(f"失败的响应文本: {response_text}")
+            raise ParseError("响应格式错误：无法分割响应")
+        reason = content.partition(RESPONSE_SEPARATOR)[0]
+        raise classify_query_error(status_code, reason)
+
+    # HTML 位于最后一个分隔符之后
+    if RESPONSE_SEPARATOR in content:
+        content = content.rpartition(RESPONSE_SEPARATOR)[2]
+
+    try:
+        result = parse_tables(content, use_lxml, watermarks)
+    except Exception as e:
+        _LOGGER.error(f"解析响应数据失败: {e}")
+        _LOGGER.debug(f"失败的响应文本: {response_text}")
+        raise ParseError(f"解析响应数据失败: {e}") from e
+
+    _LOGGER.info(
+        f"解析结果: 水费账单 {len(result['water_bills'])} 条, 垃圾费 {len(result['garbage_fees'])} 条, 水费欠费 {len(result['water_arrears'])} 条, 垃圾费欠费 {len(result['garbage_arrears'])} 条"
+    )
+
+    result["success"] = True
+    if watermarks:
+        result["incremental"] = True
+    return result
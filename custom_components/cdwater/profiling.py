@@ -0,0 +1,86 @@
+"""单次刷新的性能剖析
+
+在 cProfile 和 tracemalloc 下执行一次操作，返回函数耗时排行和内存分配
+变化。cProfile 记录的是事件循环线程上的全部调用，剖析期间其他集成的
+代码也会出现在结果中；执行器线程中的调用不会被记录。
+内存快照的采集和对比耗时较长，放在执行器中进行，不阻塞事件循环。
+"""
+
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict
+
+_PROFILE_LOCK = asyncio.Lock()
+
+
+async def async_profile(operation: Callable[[], Awaitable], top: int = 30) -> Dict:
+    """剖析一次异步操作
+
+    Args:
+        operation: 返回协程的函数
+        top: 函数耗时和内存分配各保留的条数
+
+    Returns:
+        可序列化的剖析结果
+    """
+    # 同一时间只能有一个 cProfile 处于启用状态（Python 3.12 起再次启用会报错），
+    # 并发的剖析请求依次执行
+    async with _PROFILE_LOCK:
+        return await _async_profile(operation, top)
+
+
+async def _async_profile(operation: Callable[[], Awaitable], top: int) -> Dict:
+    """剖析一次异步操作，调用方需持有 _PROFILE_LOCK"""
+    loop = asyncio.get_running_loop()
+    profiler = cProfile.Profile()
+    # 已经在跟踪时（例如用户自己开启了 tracemalloc）不要停止它
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        before = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+
+        error = None
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            await operation()
+        except Exception as err:
+            error = f"{type(err).__name__}: {err}"
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+
+        after = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+    differences = await loop.run_in_executor(None, after.compare_to, before, "lineno")
+    allocations = [
+        {
+            "location": str(stat.traceback),
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff,
+        }
+        for stat in differences[:top]
+    ]
+
+    return {
+        "started_at": time.time() - duration,
+        "duration": round(duration, 4),
+        "error": error,
+        "total_calls": stats.total_calls,
+        "profile": stream.getvalue(),
+        "traced_peak_bytes": peak,
+        "allocations": allocations,
+    }
@@ -0,0 +1,207 @@
+"""账单记录类型
+
+每行账单使用 slots 数据类保存，比逐行字典占用更少内存。记录保留了
+``get``、``[]`` 和 ``keys`` 等字典接口，实体属性和旧代码可以照常按键读取。
+"""
+
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from typing import Any, ClassVar, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 账单日期可能出现的格式
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%Y%m%d",
+    "%Y年%m月%d日",
+    "%Y-%m",
+    "%Y/%m",
+    "%Y%m",
+    "%Y年%m月",
+)
+
+
+class Record:
+    """记录的字典兼容接口"""
+
+    __slots__ = ()
+
+    _FIELDS: ClassVar[Tuple[str, ...]] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELDS = ()
+
+    @classmethod
+    def field_names(cls) -> Tuple[str, ...]:
+        """字段名（按表格列顺序）"""
+        if not cls._FIELDS:
+            cls._FIELDS = tuple(f.name for f in fields(cls))
+        return cls._FIELDS
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """从字典创建记录，忽略未知键"""
+        return cls(**{name: data[name] for name in cls.field_names() if name in data})
+
+    def as_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {name: getattr(self, name) for name in self.field_names()}
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.field_names()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.field_names():
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.field_names():
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.field_names()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.field_names())
+
+
+@dataclass(slots=True)
+class WaterBill(Record):
+    """水费账单"""
+
+    user_id: str
+    meter_date: str
+    previous_reading: float
+    current_reading: float
+    usage: float
+    unit_price: float
+    amount_due: float
+    amount_paid: float
+    previous_balance: float
+    current_balance: float
+    penalty_due: float
+    penalty_paid: float
+    payment_date: str
+    payment_status: str
+
+
+@dataclass(slots=True)
+class GarbageFee(Record):
+    """垃圾处理费"""
+
+    user_id: str
+    bill_date: str
+    unit_price: float
+    period_months: int
+    amount_due: float
+    amount_paid: float
+    payment_date: str
+    payment_status: str
+
+
+@dataclass(slots=True)
+class Arrear(Record):
+    """欠费记录"""
+
+    user_id: str
+    bill_date: str
+    unit_price: float
+    period_months: int
+    amount_due: float
+    amount_paid: float
+    payment_status: str
+
+    @property
+    def outstanding(self) -> float:
+        """未缴金额"""
+        return self.amount_due - self.amount_paid
+
+
+def parse_bill_date(text: str) -> Optional[date]:
+    """解析账单中的日期，无法识别时返回 None"""
+    text = (text or "").strip()
+    if not text:
+        return None
+
+    # 去掉可能存在的时间部分
+    text = text.split(" ")[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+# 按账期累积的历史表格 -> 账期日期字段
+HISTORY_DATE_FIELDS = {
+    "water_bills": "meter_date",
+    "garbage_fees": "bill_date",
+}
+
+# 数据键 -> 记录类型
+RECORD_TYPES = {
+    "water_bills": WaterBill,
+    "garbage_fees": GarbageFee,
+    "water_arrears": Arrear,
+    "garbage_arrears": Arrear,
+}
+
+
+def records_to_dicts(records: Iterable[Record]) -> List[Dict[str, Any]]:
+    """将记录列表转换为字典列表"""
+    return [record.as_dict() for record in records]
+
+
+def data_to_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """将账单数据转换为可序列化的字典"""
+    return {
+        key: records_to_dicts(value) if key in RECORD_TYPES else value
+        for key, value in data.items()
+    }
+
+
+def data_from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """从字典恢复账单数据"""
+    return {
+        key: [RECORD_TYPES[key].from_dict(item) for item in value]
+        if key in RECORD_TYPES
+        else value
+        for key, value in data.items()
+    }
+
+
+def merge_records(
+    existing: List[Record], incoming: List[Record], key_field: str
+) -> Tuple[List[Record], bool]:
+    """将新解析的记录合并到已有历史
+
+    两个列表都按账期从新到旧排列，incoming 中的记录覆盖同一账期的旧记录。
+
+    Returns:
+        (合并后的列表, 是否有变化)；没有变化时原样返回 existing
+    """
+    if not incoming:
+        return existing, False
+
+    incoming_keys = {getattr(record, key_field) for record in incoming}
+    known = {
+        getattr(record, key_field): record
+        for record in existing
+        if getattr(record, key_field) in incoming_keys
+    }
+
+    changed = len(known) != len(incoming_keys) or any(
+        known[getattr(record, key_field)] != record for record in incoming
+    )
+    if not changed:
+        return existing, False
+
+    merged = list(incoming)
+    merged.extend(
+        record for record in existing if getattr(record, key_field) not in incoming_keys
+    )
+    return merged, True
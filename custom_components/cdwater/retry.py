@@ -0,0 +1,129 @@
+"""重试调度"""
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Type
+
+from .exceptions import (
+    CdwaterError,
+    CaptchaError,
+    SessionExpiredError,
+    NetworkError,
+    ServerError,
+    ParseError,
+    InvalidAccountError,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """单类错误的重试策略"""
+
+    retry: bool = True
+    base_delay: float = 0.0
+    max_delay: float = 0.0
+    multiplier: float = 2.0
+    jitter: bool = False
+
+    def compute_delay(self, retry_index: int) -> float:
+        """计算第 retry_index 次（从0开始）重试前的等待秒数"""
+        if self.base_delay <= 0:
+            return 0.0
+
+        delay = min(self.max_delay, self.base_delay * self.multiplier**retry_index)
+        if self.jitter:
+            # full jitter: 在 [0, delay] 内均匀取值，避免多个客户端同时重试
+            delay = random.uniform(0, delay)
+        return delay
+
+
+NO_RETRY = RetryPolicy(retry=False)
+IMMEDIATE_RETRY = RetryPolicy()
+
+# 验证码错误立即换一张重试；网络和服务器错误指数退避；账号错误不重试
+DEFAULT_RETRY_POLICIES: Dict[Type[CdwaterError], RetryPolicy] = {
+    CaptchaError: IMMEDIATE_RETRY,
+    SessionExpiredError: IMMEDIATE_RETRY,
+    NetworkError: RetryPolicy(base_delay=2.0, max_delay=30.0, jitter=True),
+    ServerError: RetryPolicy(base_delay=5.0, max_delay=60.0, jitter=True),
+    ParseError: NO_RETRY,
+    InvalidAccountError: NO_RETRY,
+}
+
+
+def without_backoff(
+    policies: Optional[Dict[Type[CdwaterError], RetryPolicy]] = None,
+) -> Dict[Type[CdwaterError], RetryPolicy]:
+    """保留是否重试、去掉等待时间的策略，用于回放和压力测试"""
+    policies = DEFAULT_RETRY_POLICIES if policies is None else policies
+    return {
+        error: IMMEDIATE_RETRY if policy.retry else policy
+        for error, policy in policies.items()
+    }
+
+
+class RetryScheduler:
+    """按错误类型选择重试策略的调度器"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        policies: Optional[Dict[Type[CdwaterError], RetryPolicy]] = None,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+    ):
+        """初始化调度器
+
+        Args:
+            max_attempts: 最大尝试次数（包含第一次）
+            policies: 错误类型到重试策略的映射，未命中的错误不重试
+            sleep: 等待函数，便于替换
+        """
+        self._max_attempts = max(1, max_attempts)
+        self._policies = DEFAULT_RETRY_POLICIES if policies is None else policies
+        self._sleep = sleep
+
+    def policy_for(self, error: BaseException) -> RetryPolicy:
+        """按异常类的继承顺序查找最具体的策略"""
+        for cls in type(error).__mro__:
+            policy = self._policies.get(cls)
+            if policy is not None:
+                return policy
+        return NO_RETRY
+
+    async def run(self, operation: Callable[[int], Awaitable]):
+        """执行操作，失败时按策略重试
+
+        Args:
+            operation: 接收尝试序号（从1开始）的异步函数
+
+        Returns:
+            operation 的返回值；重试耗尽时抛出最后一次的异常
+        """
+        retry_counts: Dict[RetryPolicy, int] = {}
+
+        for attempt in range(1, self._max_attempts + 1):
+            try:
+                return await operation(attempt)
+            except CdwaterError as err:
+                policy = self.policy_for(err)
+
+                if not policy.retry:
+                    _LOGGER.info(f"{type(err).__name__} 不可重试，停止重试")
+                    raise
+                if attempt >= self._max_attempts:
+                    _LOGGER.error(f"经过 {attempt} 次尝试后仍然失败: {err}")
+                    raise
+
+                retry_index = retry_counts.get(policy, 0)
+                retry_counts[policy] = retry_index + 1
+                delay = policy.compute_delay(retry_index)
+
+                _LOGGER.info(
+                    f"{type(err).__name__}，{delay:.1f} 秒后进行第 {attempt + 1} 次尝试"
+                )
+                if delay > 0:
+                    await self._sleep(delay)
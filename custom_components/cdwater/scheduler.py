@@ -0,0 +1,147 @@
+"""按抄表周期自适应的刷新调度
+
+账单只会在抄表后更新。调度器从历史 meter_date 推算抄表周期和下一次
+预计抄表日期：周期中间很少刷新，临近预计日期时频繁刷新；看到新账单后
+预计日期顺延一个周期，刷新间隔自然拉长。payment_date 用来估计出账后
+多久缴费，在这段时间内继续频繁刷新以便及时更新缴费状态。
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from itertools import zip_longest
+from statistics import median
+from typing import Dict, Iterable, List, Optional
+
+from .records import parse_bill_date
+
+_LOGGER = logging.getLogger(__name__)
+
+# 合理的抄表周期范围（天），之外的间隔视为漏抄或数据异常
+MIN_CYCLE_DAYS = 10
+MAX_CYCLE_DAYS = 120
+
+
+@dataclass(frozen=True)
+class BillingCycle:
+    """推算出的抄表周期"""
+
+    cycle_days: float
+    last_reading: date
+    next_expected: date
+    payment_lag_days: float
+
+
+class AdaptivePollingScheduler:
+    """根据抄表周期决定下一次刷新的间隔"""
+
+    def __init__(
+        self,
+        base_interval: timedelta,
+        near_window: timedelta = timedelta(days=3),
+        near_interval: timedelta = timedelta(hours=6),
+        max_interval: timedelta = timedelta(days=14),
+    ):
+        """初始化调度器
+
+        Args:
+            base_interval: 无法推算周期时使用的间隔（用户配置的更新间隔）
+            near_window: 预计抄表日期前后多长时间算作临近
+            near_interval: 临近预计日期时的刷新间隔
+            max_interval: 周期中间的最长刷新间隔
+        """
+        self.base_interval = base_interval
+        self._near_window = near_window
+        self._near_interval = near_interval
+        self._max_interval = max_interval
+        self.cycle: Optional[BillingCycle] = None
+        self.refreshes = 0
+        self.useful_refreshes = 0
+
+    def learn(
+        self, meter_dates: Iterable[str], payment_dates: Iterable[str] = ()
+    ) -> Optional[BillingCycle]:
+        """从历史账单推算抄表周期
+
+        Args:
+            meter_dates: 各期抄表日期
+            payment_dates: 与 meter_dates 一一对应的缴费日期
+        """
+        readings: List[date] = []
+        lags: List[int] = []
+        for meter_text, payment_text in zip_longest(meter_dates, payment_dates):
+            reading = parse_bill_date(meter_text)
+            if reading is None:
+                continue
+            readings.append(reading)
+            payment = parse_bill_date(payment_text)
+            if payment is not None and payment >= reading:
+                lags.append((payment - reading).days)
+
+        readings = sorted(set(readings))
+        intervals = [
+            (later - earlier).days
+            for earlier, later in zip(readings, readings[1:])
+            if MIN_CYCLE_DAYS <= (later - earlier).days <= MAX_CYCLE_DAYS
+        ]
+
+        if not intervals:
+            self.cycle = None
+            return None
+
+        cycle_days = median(intervals)
+        last_reading = readings[-1]
+        self.cycle = BillingCycle(
+            cycle_days=cycle_days,
+            last_reading=last_reading,
+            next_expected=last_reading + timedelta(days=cycle_days),
+            payment_lag_days=median(lags) if lags else 0,
+        )
+        return self.cycle
+
+    def record_refresh(self, useful: bool):
+        """记录一次刷新是否带来了新数据"""
+        self.refreshes += 1
+        if useful:
+            self.useful_refreshes += 1
+
+    def next_interval(self, now: datetime) -> timedelta:
+        """计算下一次刷新的间隔"""
+        cycle = self.cycle
+        if cycle is None:
+            return self.base_interval
+
+        expected = datetime.combine(cycle.next_expected, now.time(), now.tzinfo)
+        window_start = expected - self._near_window
+        window_end = expected + max(
+            self._near_window, timedelta(days=cycle.payment_lag_days)
+        )
+
+        if now < window_start:
+            # 周期中间：直接等到临近窗口开始
+            interval = min(window_start - now, self._max_interval)
+            return max(interval, self._near_interval)
+
+        if now <= window_end:
+            return self._near_interval
+
+        # 临近窗口已过仍没有新账单，可能推算有误，回到基础间隔
+        return self.base_interval
+
+    def as_dict(self) -> Dict:
+        """转换为可序列化的字典"""
+        cycle = self.cycle
+        return {
+            "cycle_days": cycle.cycle_days if cycle else None,
+            "last_reading": cycle.last_reading.isoformat() if cycle else None,
+            "next_expected": cycle.next_expected.isoformat() if cycle else None,
+            "payment_lag_days": cycle.payment_lag_days if cycle else None,
+            "refreshes": self.refreshes,
+            "useful_refreshes": self.useful_refreshes,
+            "refreshes_per_useful_update": (
+                round(self.refreshes / self.useful_refreshes, 2)
+                if self.useful_refreshes
+                else None
+            ),
+        }
+
@@ -8,7 +8,7 @@ from homeassistant.components.sensor import (
 )
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import UnitOfVolume
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
@@ -43,11 +43,38 @@ async def async_setup_entry(
 class CdwaterBaseSensor(CoordinatorEntity, SensorEntity):
     """成都自来水基础传感器"""
 
+    # 状态依赖的快照字段，快照中这些字段没变化时跳过状态计算
+    _snapshot_fields: frozenset = frozenset({"latest_water_bill"})
+
     def __init__(self, coordinator: CdwaterDataUpdateCoordinator, entry: ConfigEntry):
         """初始化传感器"""
         super().__init__(coordinator)
         self._entry = entry
         self._user_id = entry.data["user_id"]
+        # 上次写入的 (可用性, 状态值, 属性)
+        self._written_state = None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """协调器更新时，只有状态或属性变化才写入状态"""
+        available = self.available
+        written = self._written_state
+        if (
+            written is not None
+            and written[0] == available
+            and not self._snapshot_fields & self.coordinator.changed_fields
+        ):
+            self.coordinator.metrics.increment("state_writes_suppressed")
+            return
+
+        state = (available, self.native_value, self.extra_state_attributes)
+        if state == written:
+            self.coordinator.metrics.increment("state_writes_suppressed")
+            return
+
+        self._written_state = state
+        self.coordinator.metrics.increment("state_writes")
+        self.async_write_ha_state()
 
     @property
     def device_info(self):
@@ -63,6 +90,16 @@ class CdwaterBaseSensor(CoordinatorEntity, SensorEntity):
 class CdwaterUsageSensor(CdwaterBaseSensor):
     """用水量传感器"""
 
+    _snapshot_fields = frozenset(
+        {
+            "latest_water_bill",
+            "latest_year",
+            "usage_change",
+            "usage_change_percent",
+            "yearly_usage",
+        }
+    )
+
     def __init__(self, coordinator: CdwaterDataUpdateCoordinator, entry: ConfigEntry):
         super().__init__(coordinator, entry)
         self._attr_unique_id = f"{DOMAIN}_{self._user_id}_usage"
@@ -75,21 +112,25 @@ class CdwaterUsageSensor(CdwaterBaseSensor):
     @property
     def native_value(self):
         """传感器值"""
-        bill = self.coordinator.latest_water_bill
-        return bill.get("usage") if bill else None
+        bill = self.coordinator.snapshot.latest_water_bill
+        return bill.usage if bill else None
 
     @property
     def extra_state_attributes(self):
         """额外属性"""
-        bill = self.coordinator.latest_water_bill
+        snapshot = self.coordinator.snapshot
+        bill = snapshot.latest_water_bill
         if not bill:
             return {}
 
         return {
-            "meter_date": bill.get("meter_date"),
-            "unit_price": bill.get("unit_price"),
-            "previous_reading": bill.get("previous_reading"),
-            "current_reading": bill.get("current_reading"),
+            "meter_date": bill.meter_date,
+            "unit_price": bill.unit_price,
+            "previous_reading": bill.previous_reading,
+            "current_reading": bill.current_reading,
+            "usage_change": snapshot.usage_change,
+            "usage_change_percent": snapshot.usage_change_percent,
+            "year_usage": snapshot.yearly_usage.get(snapshot.latest_year),
         }
 
 
@@ -108,8 +149,8 @@ class CdwaterCurrentReadingSensor(CdwaterBaseSensor):
     @property
     def native_value(self):
         """传感器值"""
-        bill = self.coordinator.latest_water_bill
-        return bill.get("current_reading") if bill else None
+        bill = self.coordinator.snapshot.latest_water_bill
+        return bill.current_reading if bill else None
 
 
 class CdwaterPreviousReadingSensor(CdwaterBaseSensor):
@@ -127,13 +168,17 @@ class CdwaterPreviousReadingSensor(CdwaterBaseSensor):
     @property
     def native_value(self):
         """传感器值"""
-        bill = self.coordinator.latest_water_bill
-        return bill.get("previous_reading") if bill else None
+        bill = self.coordinator.snapshot.latest_water_bill
+        return bill.previous_reading if bill else None
 
 
 class CdwaterAmountDueSensor(CdwaterBaseSensor):
     """应缴费用传感器"""
 
+    _snapshot_fields = frozenset(
+        {"latest_water_bill", "latest_year", "yearly_water_amount", "average_unit_price"}
+    )
+
     def __init__(self, coordinator: CdwaterDataUpdateCoordinator, entry: ConfigEntry):
         super().__init__(coordinator, entry)
         self._attr_unique_id = f"{DOMAIN}_{self._user_id}_amount_due"
@@ -146,8 +191,20 @@ class CdwaterAmountDueSensor(CdwaterBaseSensor):
     @property
     def native_value(self):
         """传感器值"""
-        bill = self.coordinator.latest_water_bill
-        return bill.get("amount_due") if bill else None
+        bill = self.coordinator.snapshot.latest_water_bill
+        return bill.amount_due if bill else None
+
+    @property
+    def extra_state_attributes(self):
+        """额外属性"""
+        snapshot = self.coordinator.snapshot
+        if not snapshot.latest_water_bill:
+            return {}
+
+        return {
+            "year_amount_due": snapshot.yearly_water_amount.get(snapshot.latest_year),
+            "average_unit_price": snapshot.average_unit_price,
+        }
 
 
 class CdwaterAmountPaidSensor(CdwaterBaseSensor):
@@ -165,8 +222,8 @@ class CdwaterAmountPaidSensor(CdwaterBaseSensor):
     @property
     def native_value(self):
         """传感器值"""
-        bill = self.coordinator.latest_water_bill
-        return bill.get("amount_paid") if bill else None
+        bill = self.coordinator.snapshot.latest_water_bill
+        return bill.amount_paid if bill else None
 
 
 class CdwaterPaymentStatusSensor(CdwaterBaseSensor):
@@ -181,25 +238,27 @@ class CdwaterPaymentStatusSensor(CdwaterBaseSensor):
     @property
     def native_value(self):
         """传感器值"""
-        bill = self.coordinator.latest_water_bill
-        return bill.get("payment_status") if bill else None
+        bill = self.coordinator.snapshot.latest_water_bill
+        return bill.payment_status if bill else None
 
     @property
     def extra_state_attributes(self):
         """额外属性"""
-        bill = self.coordinator.latest_water_bill
+        bill = self.coordinator.snapshot.latest_water_bill
         if not bill:
             return {}
 
         return {
-            "payment_date": bill.get("payment_date"),
-            "meter_date": bill.get("meter_date"),
+            "payment_date": bill.payment_date,
+            "meter_date": bill.meter_date,
         }
 
 
 class CdwaterGarbageFeeSensor(CdwaterBaseSensor):
     """垃圾处理费传感器"""
 
+    _snapshot_fields = frozenset({"latest_garbage_fee"})
+
     def __init__(self, coordinator: CdwaterDataUpdateCoordinator, entry: ConfigEntry):
         super().__init__(coordinator, entry)
         self._attr_unique_id = f"{DOMAIN}_{self._user_id}_garbage_fee"
@@ -212,27 +271,31 @@ class CdwaterGarbageFeeSensor(CdwaterBaseSensor):
     @property
     def native_value(self):
         """传感器值"""
-        fee = self.coordinator.latest_garbage_fee
-        return fee.get("amount_due") if fee else None
+        fee = self.coordinator.snapshot.latest_garbage_fee
+        return fee.amount_due if fee else None
 
     @property
     def extra_state_attributes(self):
         """额外属性"""
-        fee = self.coordinator.latest_garbage_fee
+        fee = self.coordinator.snapshot.latest_garbage_fee
         if not fee:
             return {}
 
         return {
-            "bill_date": fee.get("bill_date"),
-            "amount_paid": fee.get("amount_paid"),
-            "payment_status": fee.get("payment_status"),
-            "payment_date": fee.get("payment_date"),
+            "bill_date": fee.bill_date,
+            "amount_paid": fee.amount_paid,
+            "payment_status": fee.payment_status,
+            "payment_date": fee.payment_date,
         }
 
 
 class CdwaterTotalArrearsSensor(CdwaterBaseSensor):
     """总欠费传感器"""
 
+    _snapshot_fields = frozenset(
+        {"total_arrears", "water_arrears_total", "garbage_arrears_total"}
+    )
+
     def __init__(self, coordinator: CdwaterDataUpdateCoordinator, entry: ConfigEntry):
         super().__init__(coordinator, entry)
         self._attr_unique_id = f"{DOMAIN}_{self._user_id}_total_arrears"
@@ -245,4 +308,13 @@ class CdwaterTotalArrearsSensor(CdwaterBaseSensor):
     @property
     def native_value(self):
         """传感器值"""
-        return self.coordinator.total_arrears
+        return self.coordinator.snapshot.total_arrears
+
+    @property
+    def extra_state_attributes(self):
+        """额外属性"""
+        snapshot = self.coordinator.snapshot
+        return {
+            "water_arrears": snapshot.water_arrears_total,
+            "garbage_arrears": snapshot.garbage_arrears_total,
+        }
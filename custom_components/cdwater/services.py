@@ -0,0 +1,111 @@
+"""集成服务"""
+
+import logging
+import os
+
+import voluptuous as vol
+
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, EXPORT_DIR
+from .export import EXPORT_FORMATS, FORMAT_CSV
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_PROFILE_REFRESH = "profile_refresh"
+SERVICE_EXPORT_HISTORY = "export_history"
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_TOP = "top"
+ATTR_FORMAT = "format"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_FILENAME = "filename"
+
+PROFILE_REFRESH_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_TOP, default=30): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=200)
+        ),
+    }
+)
+
+
+EXPORT_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_FORMAT, default=FORMAT_CSV): vol.In(EXPORT_FORMATS),
+        vol.Optional(ATTR_START): cv.date,
+        vol.Optional(ATTR_END): cv.date,
+        vol.Optional(ATTR_FILENAME): cv.string,
+    }
+)
+
+
+def _get_coordinator(hass: HomeAssistant, entry_id: str):
+    """获取已加载配置条目的协调器"""
+    coordinator = hass.data.get(DOMAIN, {}).get(entry_id)
+    if coordinator is None or not hasattr(coordinator, "history"):
+        raise ServiceValidationError(f"找不到已加载的配置条目: {entry_id}")
+    return coordinator
+
+
+def _export_path(hass: HomeAssistant, filename: str) -> str:
+    """导出文件路径，只允许写入配置目录下的导出目录"""
+    if (
+        not filename
+        or filename != os.path.basename(filename)
+        or filename.startswith(".")
+    ):
+        raise ServiceValidationError(f"无效的文件名: {filename}")
+    return hass.config.path(EXPORT_DIR, filename)
+
+
+def async_setup_services(hass: HomeAssistant):
+    """注册服务（只注册一次）"""
+    if hass.services.has_service(DOMAIN, SERVICE_PROFILE_REFRESH):
+        return
+
+    async def async_profile_refresh(call: ServiceCall) -> ServiceResponse:
+        """剖析一次刷新，结果同时附加到诊断信息"""
+        coordinator = _get_coordinator(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+        return await coordinator.async_profile_refresh(call.data[ATTR_TOP])
+
+    async def async_export_history(call: ServiceCall) -> ServiceResponse:
+        """把账单历史导出到配置目录下的文件"""
+        coordinator = _get_coordinator(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+        fmt = call.data[ATTR_FORMAT]
+        start = call.data.get(ATTR_START)
+        end = call.data.get(ATTR_END)
+        if start and end and start > end:
+            raise ServiceValidationError("起始日期不能晚于截止日期")
+
+        filename = call.data.get(ATTR_FILENAME) or (
+            f"{coordinator.user_id}_{dt_util.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+        )
+        path = _export_path(hass, filename)
+        return await coordinator.async_export_history(path, fmt, start, end)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE_REFRESH,
+        async_profile_refresh,
+        schema=PROFILE_REFRESH_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT_HISTORY,
+        async_export_history,
+        schema=EXPORT_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
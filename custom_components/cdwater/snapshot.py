@@ -0,0 +1,121 @@
+"""账单快照
+
+每次数据更新后计算一次最新账单、欠费合计和各类统计，实体直接读取
+快照字段，不再在每次读取状态时遍历账单列表。
+"""
+
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional
+
+from .records import Arrear, GarbageFee, WaterBill, parse_bill_date
+
+
+def _empty_mapping() -> Mapping[int, float]:
+    return MappingProxyType({})
+
+
+@dataclass(frozen=True, slots=True)
+class BillSnapshot:
+    """一次更新后的账单快照（不可变）"""
+
+    latest_water_bill: Optional[WaterBill] = None
+    previous_water_bill: Optional[WaterBill] = None
+    latest_garbage_fee: Optional[GarbageFee] = None
+    # 最新账单所在年份
+    latest_year: Optional[int] = None
+    water_arrears_total: float = 0.0
+    garbage_arrears_total: float = 0.0
+    total_arrears: float = 0.0
+    # 与上一期相比的用水量变化
+    usage_change: Optional[float] = None
+    usage_change_percent: Optional[float] = None
+    # 按抄表年份汇总
+    yearly_usage: Mapping[int, float] = field(default_factory=_empty_mapping)
+    yearly_water_amount: Mapping[int, float] = field(default_factory=_empty_mapping)
+    yearly_garbage_amount: Mapping[int, float] = field(default_factory=_empty_mapping)
+    # 全部历史的平均单价（总金额 / 总用水量）
+    average_unit_price: Optional[float] = None
+
+
+EMPTY_SNAPSHOT = BillSnapshot()
+
+
+def _outstanding(arrears: List[Arrear]) -> float:
+    return round(sum(arrear.outstanding for arrear in arrears), 2)
+
+
+def _add(totals: Dict[int, float], date_text: str, value: float):
+    bill_date = parse_bill_date(date_text)
+    if bill_date is not None:
+        totals[bill_date.year] = totals.get(bill_date.year, 0.0) + value
+
+
+def _freeze(totals: Dict[int, float]) -> Mapping[int, float]:
+    return MappingProxyType(
+        {year: round(value, 2) for year, value in sorted(totals.items(), reverse=True)}
+    )
+
+
+def build_snapshot(data: Optional[Dict[str, Any]]) -> BillSnapshot:
+    """根据账单数据计算快照"""
+    if not data:
+        return EMPTY_SNAPSHOT
+
+    water_bills: List[WaterBill] = data.get("water_bills") or []
+    garbage_fees: List[GarbageFee] = data.get("garbage_fees") or []
+
+    latest = water_bills[0] if water_bills else None
+    previous = water_bills[1] if len(water_bills) > 1 else None
+    latest_reading = parse_bill_date(latest.meter_date) if latest else None
+
+    usage_change = None
+    usage_change_percent = None
+    if latest is not None and previous is not None:
+        usage_change = round(latest.usage - previous.usage, 2)
+        if previous.usage:
+            usage_change_percent = round(usage_change / previous.usage * 100, 1)
+
+    yearly_usage: Dict[int, float] = {}
+    yearly_water_amount: Dict[int, float] = {}
+    total_usage = 0.0
+    total_amount = 0.0
+    for bill in water_bills:
+        _add(yearly_usage, bill.meter_date, bill.usage)
+        _add(yearly_water_amount, bill.meter_date, bill.amount_due)
+        total_usage += bill.usage
+        total_amount += bill.amount_due
+
+    yearly_garbage_amount: Dict[int, float] = {}
+    for fee in garbage_fees:
+        _add(yearly_garbage_amount, fee.bill_date, fee.amount_due)
+
+    water_arrears_total = _outstanding(data.get("water_arrears") or [])
+    garbage_arrears_total = _outstanding(data.get("garbage_arrears") or [])
+
+    return BillSnapshot(
+        latest_water_bill=latest,
+        previous_water_bill=previous,
+        latest_garbage_fee=garbage_fees[0] if garbage_fees else None,
+        latest_year=latest_reading.year if latest_reading else None,
+        water_arrears_total=water_arrears_total,
+        garbage_arrears_total=garbage_arrears_total,
+        total_arrears=round(water_arrears_total + garbage_arrears_total, 2),
+        usage_change=usage_change,
+        usage_change_percent=usage_change_percent,
+        yearly_usage=_freeze(yearly_usage),
+        yearly_water_amount=_freeze(yearly_water_amount),
+        yearly_garbage_amount=_freeze(yearly_garbage_amount),
+        average_unit_price=(
+            round(total_amount / total_usage, 4) if total_usage else None
+        ),
+    )
+
+
+def diff_snapshots(old: BillSnapshot, new: BillSnapshot) -> FrozenSet[str]:
+    """比较两个快照，返回值不同的字段名"""
+    return frozenset(
+        item.name
+        for item in fields(BillSnapshot)
+        if getattr(old, item.name) != getattr(new, item.name)
+    )
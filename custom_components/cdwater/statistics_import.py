@@ -0,0 +1,165 @@
+"""导入长期统计
+
+传感器只反映最新一期账单，这里把水费账单和垃圾处理费历史按账期导入为
+Home Assistant 外部统计（用水量、水表读数、水费、垃圾处理费），能源和
+用水面板可以直接显示完整历史。每次只导入比已有统计更新的账期。
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfVolume
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+from .records import parse_bill_date
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StatisticDefinition:
+    """一项外部统计的定义"""
+
+    suffix: str
+    name: str
+    unit: str
+    data_key: str
+    date_field: str
+    value: Callable[[object], float]
+    # True 为累计量（sum），False 为读数（mean/min/max）
+    cumulative: bool = True
+
+
+STATISTICS = (
+    StatisticDefinition(
+        "water_usage",
+        "用水量",
+        UnitOfVolume.CUBIC_METERS,
+        "water_bills",
+        "meter_date",
+        lambda bill: bill.usage,
+    ),
+    StatisticDefinition(
+        "meter_reading",
+        "水表读数",
+        UnitOfVolume.CUBIC_METERS,
+        "water_bills",
+        "meter_date",
+        lambda bill: bill.current_reading,
+        cumulative=False,
+    ),
+    StatisticDefinition(
+        "water_cost",
+        "水费",
+        "CNY",
+        "water_bills",
+        "meter_date",
+        lambda bill: bill.amount_due,
+    ),
+    StatisticDefinition(
+        "garbage_cost",
+        "垃圾处理费",
+        "CNY",
+        "garbage_fees",
+        "bill_date",
+        lambda fee: fee.amount_due,
+    ),
+)
+
+
+def statistic_id(user_id: str, definition: StatisticDefinition) -> str:
+    """外部统计 ID"""
+    return f"{DOMAIN}:{user_id}_{definition.suffix}"
+
+
+def _period_start(date_text: str) -> Optional[datetime]:
+    """账期日期对应的统计起始时间（当地零点）"""
+    bill_date = parse_bill_date(date_text)
+    if bill_date is None:
+        return None
+    return dt_util.start_of_local_day(bill_date)
+
+
+async def _async_last_statistic(hass: HomeAssistant, stat_id: str) -> Optional[Dict]:
+    """读取已导入的最后一条统计"""
+    last = await get_instance(hass).async_add_executor_job(
+        get_last_statistics, hass, 1, stat_id, True, {"sum", "state"}
+    )
+    rows = last.get(stat_id)
+    return rows[0] if rows else None
+
+
+async def async_import_statistics(
+    hass: HomeAssistant, user_id: str, data: Dict[str, List]
+) -> int:
+    """把账单历史中新的账期导入为外部统计
+
+    Returns:
+        新导入的统计条数
+    """
+    imported = 0
+
+    for definition in STATISTICS:
+        stat_id = statistic_id(user_id, definition)
+
+        # 按账期从旧到新排列，同一账期只取一条
+        periods: Dict[datetime, object] = {}
+        for record in data.get(definition.data_key) or []:
+            start = _period_start(getattr(record, definition.date_field))
+            if start is not None and start not in periods:
+                periods[start] = record
+        if not periods:
+            continue
+
+        last = await _async_last_statistic(hass, stat_id)
+        last_start = None
+        running_sum = 0.0
+        if last is not None:
+            last_start = last["start"]
+            if not isinstance(last_start, datetime):
+                last_start = dt_util.utc_from_timestamp(last_start)
+            running_sum = last.get("sum") or 0.0
+
+        statistics = []
+        for start in sorted(periods):
+            if last_start is not None and start <= last_start:
+                continue
+
+            value = definition.value(periods[start])
+            if definition.cumulative:
+                running_sum += value
+                statistics.append(
+                    StatisticData(start=start, state=value, sum=running_sum)
+                )
+            else:
+                statistics.append(
+                    StatisticData(start=start, state=value, mean=value, min=value, max=value)
+                )
+
+        if not statistics:
+            continue
+
+        metadata = StatisticMetaData(
+            has_mean=not definition.cumulative,
+            has_sum=definition.cumulative,
+            name=f"成都自来水 {user_id} {definition.name}",
+            source=DOMAIN,
+            statistic_id=stat_id,
+            unit_of_measurement=definition.unit,
+        )
+        async_add_external_statistics(hass, metadata, statistics)
+        imported += len(statistics)
+
+    if imported:
+        _LOGGER.info(f"用户 {user_id} 导入了 {imported} 条长期统计")
+    return imported
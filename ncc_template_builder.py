@@ -392,6 +392,29 @@ async def test_mode():
     print(f"Accuracy: {recognized_count / num_tests:.2%}")
 
 
+def compile_mode(templates_dir=TEMPLATES_DIR):
+    """模式3: 编译原型包 - 为每个字符生成平移、加粗、变细的变体并聚类为原型
+
+    原型数与模板数相同，识别耗时不变；生成的 prototypes.npz 放在模板目录中，
+    识别器会优先使用它，包中没有的新模板仍然单独加载。
+    """
+    print("\n--- [Compile Mode] ---")
+    # 从仓库根目录导入识别器的预处理，保证编译和识别使用同样的向量
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import tools  # noqa: F401  注册集成包，不导入 Home Assistant
+    from custom_components.cdwater.ncc import compile_template_pack
+
+    if not os.path.isdir(templates_dir) or not os.listdir(templates_dir):
+        print("No templates found. Please run build mode first to create your template library.")
+        return
+
+    result = compile_template_pack(templates_dir)
+    print(
+        f"Compiled {result['templates']} templates for {result['characters']} characters "
+        f"into {result['prototypes']} prototypes: {result['path']} ({result['bytes']} bytes)"
+    )
+
+
 async def main():
     if not os.path.exists(TEMPLATES_DIR):
         os.makedirs(TEMPLATES_DIR)
@@ -402,22 +425,30 @@ async def main():
         print("\n--- OCR CLI Main Menu ---")
         print("1. Build Templates (smart interactive)")
         print("2. Run Automated Tests (with correction)")
-        print("3. Exit")
+        print("3. Compile Prototype Pack")
+        print("4. Exit")
 
-        choice = input("Enter your choice (1-3): ")
+        choice = input("Enter your choice (1-4): ")
 
         if choice == "1":
             await build_mode()
         elif choice == "2":
             await test_mode()
         elif choice == "3":
+            compile_mode()
+        elif choice == "4":
             print("Exiting...")
             break
         else:
-            print("Invalid choice. Please enter 1, 2, or 3.")
+            print("Invalid choice. Please enter 1, 2, 3, or 4.")
 
 
 if __name__ == "__main__":
+    # 非交互编译: python ncc_template_builder.py compile [模板目录]
+    if len(sys.argv) > 1 and sys.argv[1] == "compile":
+        compile_mode(sys.argv[2] if len(sys.argv) > 2 else TEMPLATES_DIR)
+        sys.exit(0)
+
     if sys.version_info >= (3, 7):
         asyncio.run(main())
     else:
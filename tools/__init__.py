@@ -0,0 +1,33 @@
+"""离线工具（基准测试、批量查询等）
+
+custom_components/cdwater/__init__.py 依赖 Home Assistant。这里把集成目录注册为
+一个不执行 __init__.py 的包，使 client、parser、captcha 等不依赖 Home Assistant
+的模块可以在普通 Python 环境中直接导入。
+"""
+
+import importlib
+import os
+import sys
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPONENT_DIR = os.path.join(REPO_ROOT, "custom_components", "cdwater")
+COMPONENT_PACKAGE = "custom_components.cdwater"
+
+
+def _register_component_package():
+    """注册集成包，跳过依赖 Home Assistant 的 __init__.py"""
+    if COMPONENT_PACKAGE in sys.modules:
+        return
+
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    importlib.import_module("custom_components")
+
+    package = types.ModuleType(COMPONENT_PACKAGE)
+    package.__path__ = [COMPONENT_DIR]
+    package.__package__ = COMPONENT_PACKAGE
+    sys.modules[COMPONENT_PACKAGE] = package
+
+
+_register_component_package()
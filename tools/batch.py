@@ -0,0 +1,197 @@
+"""批量查询多个用户号（不依赖 Home Assistant）
+
+从文件或标准输入逐行读取用户号（空行和 # 开头的行忽略），用共享的连接池
+和验证码识别器并发查询。每个用户号完成后立即输出一行 JSON，结束时输出
+耗时和失败的汇总。用户号边读边查，内存占用与用户号数量无关。
+
+用法:
+    python -m tools.batch accounts.txt --concurrency 4 --out bills.jsonl
+    cat accounts.txt | python -m tools.batch - --summary summary.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import Counter
+from typing import Dict, Optional, TextIO
+
+import aiohttp
+
+from custom_components.cdwater.captcha import (
+    CAPTCHA_METHOD_CHAOJIYING,
+    CAPTCHA_METHOD_NCC,
+    CaptchaRecognizer,
+)
+from custom_components.cdwater.client import BASE_URL, CdwaterClient
+from custom_components.cdwater.metrics import FetchTimeline, LatencyHistogram
+from custom_components.cdwater.records import data_to_dict
+
+# 耗时分布保留的样本数，超过后只统计最近的样本
+LATENCY_WINDOW = 10000
+
+
+class BatchSummary:
+    """批量查询的汇总统计（固定内存）"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0
+        self.successes = 0
+        self.attempts = 0
+        self.failures: Counter = Counter()
+        self.latency = LatencyHistogram(LATENCY_WINDOW)
+
+    def add(self, result: Dict):
+        """记录一个用户号的结果"""
+        self.total += 1
+        self.latency.add(result["duration"])
+        if result["ok"]:
+            self.successes += 1
+            self.attempts += result["attempts"]
+        else:
+            self.failures[result["error_type"]] += 1
+
+    def as_dict(self) -> Dict:
+        """转换为可序列化的字典"""
+        elapsed = time.perf_counter() - self.started
+        return {
+            "accounts": self.total,
+            "successes": self.successes,
+            "failures": dict(self.failures),
+            "elapsed": round(elapsed, 2),
+            "accounts_per_second": round(self.total / elapsed, 2) if elapsed else None,
+            "attempts_per_success": (
+                round(self.attempts / self.successes, 2) if self.successes else None
+            ),
+            "latency": self.latency.summary(),
+        }
+
+
+async def read_accounts(stream: TextIO, queue: asyncio.Queue, workers: int):
+    """逐行读取用户号放入队列，结束后为每个工作协程放入 None"""
+    loop = asyncio.get_running_loop()
+    while True:
+        # 标准输入的 readline 会阻塞，放到线程中执行
+        line = await loop.run_in_executor(None, stream.readline)
+        if not line:
+            break
+        user_id = line.strip()
+        if user_id and not user_id.startswith("#"):
+            await queue.put(user_id)
+    for _ in range(workers):
+        await queue.put(None)
+
+
+async def fetch_account(
+    user_id: str,
+    recognizer: CaptchaRecognizer,
+    connector: aiohttp.BaseConnector,
+    args,
+) -> Dict:
+    """查询一个用户号，返回可输出的结果"""
+    timeline = FetchTimeline()
+    start = time.perf_counter()
+    result: Dict = {"user_id": user_id}
+    try:
+        async with CdwaterClient(
+            recognizer,
+            max_retries=args.max_retries,
+            connector=connector,
+            base_url=args.url,
+        ) as client:
+            data = await client.get_water_bill_data(user_id, timeline)
+    except Exception as err:
+        # 单个用户号的任何异常都只记为失败，不中断整个批次
+        result.update(ok=False, error_type=type(err).__name__, error=str(err))
+    else:
+        result.update(ok=True, data=data_to_dict(data))
+    result["duration"] = round(time.perf_counter() - start, 4)
+    result["attempts"] = timeline.attempts
+    return result
+
+
+def create_recognizer(args) -> CaptchaRecognizer:
+    """根据命令行参数创建识别器"""
+    if args.chaojiying:
+        username, password, soft_id = args.chaojiying
+        return CaptchaRecognizer(
+            CAPTCHA_METHOD_CHAOJIYING,
+            username=username,
+            password=password,
+            soft_id=soft_id,
+        )
+    return CaptchaRecognizer(CAPTCHA_METHOD_NCC)
+
+
+async def run_batch(args, stream: TextIO, output: TextIO) -> BatchSummary:
+    """执行批量查询"""
+    recognizer = create_recognizer(args)
+    await recognizer.async_warm_up()
+
+    summary = BatchSummary()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+
+    async def worker():
+        while True:
+            user_id = await queue.get()
+            if user_id is None:
+                return
+            result = await fetch_account(user_id, recognizer, connector, args)
+            summary.add(result)
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+
+    try:
+        await asyncio.gather(
+            read_accounts(stream, queue, args.concurrency),
+            *(worker() for _ in range(args.concurrency)),
+        )
+    finally:
+        await connector.close()
+    return summary
+
+
+def _open(path: Optional[str], mode: str, default: TextIO) -> TextIO:
+    if path is None or path == "-":
+        return default
+    return open(path, mode, encoding="utf-8")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("accounts", help="用户号文件，- 表示标准输入")
+    arg_parser.add_argument("--out", default=None, help="结果 JSON Lines 文件，默认标准输出")
+    arg_parser.add_argument("--summary", default=None, help="汇总 JSON 文件，默认输出到标准错误")
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="同时查询的用户号数")
+    arg_parser.add_argument("--max-retries", type=int, default=3, help="每个用户号的最大尝试次数")
+    arg_parser.add_argument("--url", default=BASE_URL, help="网站地址")
+    arg_parser.add_argument("--chaojiying", nargs=3, metavar=("USER", "PASS", "SOFTID"), help="使用超级鹰识别验证码")
+    arg_parser.add_argument("--verbose", action="store_true", help="输出客户端日志")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    stream = _open(args.accounts, "r", sys.stdin)
+    output = _open(args.out, "w", sys.stdout)
+    try:
+        summary = asyncio.run(run_batch(args, stream, output))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if output is not sys.stdout:
+            output.close()
+
+    text = json.dumps(summary.as_dict(), ensure_ascii=False, indent=2)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""验证码识别基准测试
+
+用模板字符拼出一批验证码，对比逐张 recognize 与一次 recognize_many 的
+耗时和准确率。指定 --url 时测试远程 NCC 识别服务。
+
+用法:
+    python -m tools.bench_captcha --size 500 --repeat 3
+    python -m tools.bench_captcha --url http://localhost:8090
+"""
+
+import argparse
+import asyncio
+import time
+
+from custom_components.cdwater.captcha import (
+    CAPTCHA_METHOD_NCC,
+    CAPTCHA_METHOD_REMOTE_NCC,
+    CaptchaRecognizer,
+)
+from tools.fake_server import build_captcha_corpus
+
+
+def _accuracy(results, answers) -> float:
+    correct = sum(
+        1
+        for result, answer in zip(results, answers)
+        if not isinstance(result, Exception) and result[0] == answer
+    )
+    return correct / len(answers)
+
+
+async def run_bench(args):
+    corpus = build_captcha_corpus(args.size, seed=args.seed)
+    images = [image for image, _answer in corpus]
+    answers = [answer for _image, answer in corpus]
+
+    if args.url:
+        recognizer = CaptchaRecognizer(CAPTCHA_METHOD_REMOTE_NCC, url=args.url)
+    else:
+        recognizer = CaptchaRecognizer(CAPTCHA_METHOD_NCC)
+        await recognizer.async_warm_up()
+
+    for name in ("recognize", "recognize_many"):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            if name == "recognize":
+                results = []
+                for image in images:
+                    try:
+                        results.append(await recognizer.recognize(image))
+                    except Exception as err:
+                        results.append(err)
+            else:
+                results = await recognizer.recognize_many(images)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(
+            f"{name:<15} {best * 1000:9.1f} ms  "
+            f"{best / len(images) * 1000:7.3f} ms/张  "
+            f"准确率 {_accuracy(results, answers):.1%}"
+        )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--size", type=int, default=500, help="验证码数量")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最快一次")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--url", default=None, help="远程 NCC 识别服务地址")
+    asyncio.run(run_bench(arg_parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
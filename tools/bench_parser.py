@@ -0,0 +1,244 @@
+"""响应解析器基准测试
+
+生成多年账单历史的模拟响应，对比旧的 HTMLParser 表格遍历实现
+与单次扫描解析器（正则 / lxml 两种后端）。
+
+用法:
+    python -m tools.bench_parser --years 20 --repeat 50
+"""
+
+import argparse
+import random
+import timeit
+from html.parser import HTMLParser
+
+from custom_components.cdwater import parser
+from custom_components.cdwater.records import data_to_dict
+
+
+def build_response(years: int, seed: int = 0, user_id: str = "123456789") -> str:
+    """生成包含 years 年历史的模拟查询响应"""
+    rng = random.Random(seed)
+    months = years * 12
+
+    water_rows = []
+    reading = 1000.0
+    for i in range(months):
+        usage = rng.randint(5, 30)
+        water_rows.append(
+            [
+                user_id,
+                f"{2025 - i // 12}-{12 - i % 12:02d}-15",
+                f"{reading - usage:.0f}",
+                f"{reading:.0f}",
+                str(usage),
+                "3.05",
+                f"{usage * 3.05:.2f}",
+                f"{usage * 3.05:.2f}",
+                "0.00",
+                "0.00",
+                "0.00",
+                "0.00",
+                f"{2025 - i // 12}-{12 - i % 12:02d}-20",
+                "已缴费",
+            ]
+        )
+        reading -= usage
+
+    garbage_rows = [
+        [
+            user_id,
+            f"{2025 - i // 12}-{12 - i % 12:02d}",
+            "8.00",
+            "1",
+            "8.00",
+            "8.00",
+            f"{2025 - i // 12}-{12 - i % 12:02d}-20",
+            "已缴费",
+        ]
+        for i in range(months)
+    ]
+    arrear_rows = [[user_id, "2025-12", "8.00", "1", "8.00", "0.00", "未缴费"]]
+
+    def table(header_size, rows):
+        header = "<tr>" + "<th>列</th>" * header_size + "</tr>"
+        body = "".join(
+            "<tr>" + "".join(f"<td>&nbsp;{cell}&nbsp;</td>" for cell in row) + "</tr>"
+            for row in rows
+        )
+        return f'<table class="bill">{header}{body}</table>'
+
+    html = (
+        table(14, water_rows)
+        + table(8, garbage_rows)
+        + table(7, [["-"] * 7])
+        + table(7, arrear_rows)
+    )
+    return f"1w|f{html}"
+
+
+class LegacyHTMLParser(HTMLParser):
+    """旧实现：逐字符串拼接的表格遍历器"""
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self.current_table = None
+        self.current_row = None
+        self.in_table = False
+        self.in_row = False
+        self.in_cell = False
+        self.cell_text = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.in_table = True
+            self.current_table = []
+        elif tag == "tr" and self.in_table:
+            self.in_row = True
+            self.current_row = []
+        elif tag in ["td", "th"] and self.in_row:
+            self.in_cell = True
+            self.cell_text = ""
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self.in_table:
+            if self.current_table:
+                self.tables.append(self.current_table)
+            self.in_table = False
+            self.current_table = None
+        elif tag == "tr" and self.in_row:
+            if self.current_row:
+                self.current_table.append(self.current_row)
+            self.in_row = False
+            self.current_row = None
+        elif tag in ["td", "th"] and self.in_cell:
+            self.current_row.append(self.cell_text.strip())
+            self.in_cell = False
+            self.cell_text = ""
+
+    def handle_data(self, data):
+        if self.in_cell:
+            self.cell_text += data
+
+
+def _clean(text):
+    return text.replace("\xa0", "").replace("&nbsp;", "").strip() if text else ""
+
+
+def _float(text):
+    try:
+        cleaned = _clean(text)
+        return float(cleaned) if cleaned else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _int(text):
+    try:
+        cleaned = _clean(text)
+        return int(cleaned) if cleaned else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def legacy_parse(response_text: str) -> dict:
+    """旧实现：HTMLParser 生成表格后分四次遍历转换"""
+    html = response_text.split("w|f")[-1]
+    legacy = LegacyHTMLParser()
+    legacy.feed(html)
+    tables = legacy.tables
+
+    water_bills = [
+        {
+            "user_id": _clean(r[0]),
+            "meter_date": _clean(r[1]),
+            "previous_reading": _float(r[2]),
+            "current_reading": _float(r[3]),
+            "usage": _float(r[4]),
+            "unit_price": _float(r[5]),
+            "amount_due": _float(r[6]),
+            "amount_paid": _float(r[7]),
+            "previous_balance": _float(r[8]),
+            "current_balance": _float(r[9]),
+            "penalty_due": _float(r[10]),
+            "penalty_paid": _float(r[11]),
+            "payment_date": _clean(r[12]),
+            "payment_status": _clean(r[13]),
+        }
+        for r in tables[0][1:]
+        if len(r) >= 14
+    ]
+    garbage_fees = [
+        {
+            "user_id": _clean(r[0]),
+            "bill_date": _clean(r[1]),
+            "unit_price": _float(r[2]),
+            "period_months": _int(r[3]),
+            "amount_due": _float(r[4]),
+            "amount_paid": _float(r[5]),
+            "payment_date": _clean(r[6]),
+            "payment_status": _clean(r[7]),
+        }
+        for r in tables[1][1:]
+        if len(r) >= 8
+    ]
+    garbage_arrears = [
+        {
+            "user_id": _clean(r[0]),
+            "bill_date": _clean(r[1]),
+            "unit_price": _float(r[2]),
+            "period_months": _int(r[3]),
+            "amount_due": _float(r[4]),
+            "amount_paid": _float(r[5]),
+            "payment_status": _clean(r[6]),
+        }
+        for r in tables[3][1:]
+        if len(r) >= 7
+    ]
+    return {
+        "water_bills": water_bills,
+        "garbage_fees": garbage_fees,
+        "water_arrears": [],
+        "garbage_arrears": garbage_arrears,
+        "success": True,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--years", type=int, default=20, help="账单历史年数")
+    arg_parser.add_argument("--repeat", type=int, default=50, help="每种实现的运行次数")
+    args = arg_parser.parse_args()
+
+    response = build_response(args.years)
+    expected = legacy_parse(response)
+
+    candidates = {"legacy HTMLParser": legacy_parse}
+    candidates["single-pass regex"] = lambda text: parser.parse_response(
+        text, use_lxml=False
+    )
+    if parser._load_lxml():
+        candidates["single-pass lxml"] = lambda text: parser.parse_response(
+            text, use_lxml=True
+        )
+    else:
+        print("lxml 未安装，跳过 lxml 后端")
+
+    print(f"响应长度: {len(response)} 字符, 水费账单 {len(expected['water_bills'])} 条")
+
+    baseline = None
+    for name, func in candidates.items():
+        result = func(response)
+        if func is not legacy_parse:
+            result = data_to_dict(result)
+        if result != expected:
+            raise SystemExit(f"{name} 的解析结果与旧实现不一致")
+
+        elapsed = min(timeit.repeat(lambda: func(response), number=1, repeat=args.repeat))
+        baseline = baseline or elapsed
+        print(f"{name:<20} {elapsed * 1000:8.2f} ms  x{baseline / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
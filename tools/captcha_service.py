@@ -0,0 +1,194 @@
+"""验证码识别服务
+
+在一台主机上加载一份 NCC 模板，通过 HTTP 为多个 Home Assistant 实例和批量
+任务识别验证码。同时到达的请求合并成一批，用一次矩阵乘法完成打分。
+集成中选择 remote_ncc 识别方式并填写服务地址即可使用。
+
+接口:
+    POST /recognize       请求体为验证码图片，返回 {"text": ..., "confidence": ...}
+    POST /recognize_many  multipart 请求，每个部分一张图片，返回 {"results": [...]}，
+                          每项为 {"text": ..., "confidence": ...} 或 {"error": ...}
+    GET  /health          模板库和批处理统计
+
+用法:
+    python -m tools.captcha_service --port 8090
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from aiohttp import web
+
+from custom_components.cdwater.ncc import NCCCaptchaRecognizer
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class BatchingRecognizer:
+    """把并发的识别请求合并成批"""
+
+    def __init__(
+        self,
+        recognizer: NCCCaptchaRecognizer,
+        max_batch: int = 64,
+        max_delay: float = 0.005,
+    ):
+        """初始化
+
+        Args:
+            recognizer: 已预热的 NCC 识别器
+            max_batch: 每批最多的图片数
+            max_delay: 第一张图片到达后最多再等待多久凑批（秒）
+        """
+        self._recognizer = recognizer
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.images = 0
+        self.busy_seconds = 0.0
+
+    async def recognize(self, image_data: bytes) -> Tuple[str, float]:
+        """提交一张图片并等待结果"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_data, future))
+        return await future
+
+    async def _collect(self) -> List:
+        """取出一批请求：至少一个，最多 max_batch 个"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self._max_delay
+        while len(batch) < self._max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # 已经排队的请求不必再等
+        while len(batch) < self._max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        """逐批识别；识别在线程中进行，期间到达的请求进入下一批"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # 模板目录有增删时先增量更新模板库（内部限制检查频率）
+            await self._recognizer.async_check_templates()
+            images = [image for image, _future in batch]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(
+                    None, self._recognizer._recognize_batch, images
+                )
+            except Exception as err:
+                results = [err] * len(batch)
+            self.busy_seconds += time.perf_counter() - start
+            self.batches += 1
+            self.images += len(batch)
+
+            for (_image, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        """批处理统计"""
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "average_batch": round(self.images / self.batches, 2) if self.batches else None,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+def create_app(batcher: BatchingRecognizer, recognizer: NCCCaptchaRecognizer) -> web.Application:
+    """创建服务应用"""
+
+    async def recognize(request: web.Request) -> web.Response:
+        image_data = await request.read()
+        if not image_data:
+            return web.json_response({"error": "请求体为空"}, status=400)
+        try:
+            text, confidence = await batcher.recognize(image_data)
+        except Exception as err:
+            return web.json_response({"error": str(err)}, status=422)
+        return web.json_response({"text": text, "confidence": confidence})
+
+    async def recognize_many(request: web.Request) -> web.Response:
+        try:
+            reader = await request.multipart()
+        except (AssertionError, ValueError) as err:
+            return web.json_response({"error": f"需要 multipart 请求: {err}"}, status=400)
+
+        images = []
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            images.append(await part.read())
+        if not images:
+            return web.json_response({"error": "请求中没有图片"}, status=400)
+
+        # 逐张提交，和其他请求的图片一起凑批
+        outcomes = await asyncio.gather(
+            *(batcher.recognize(image_data) for image_data in images),
+            return_exceptions=True,
+        )
+        results = [
+            {"error": str(outcome)}
+            if isinstance(outcome, Exception)
+            else {"text": outcome[0], "confidence": outcome[1]}
+            for outcome in outcomes
+        ]
+        return web.json_response({"results": results})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"templates": recognizer.stats(), "batching": batcher.stats()})
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_post("/recognize", recognize)
+    app.router.add_post("/recognize_many", recognize_many)
+    app.router.add_get("/health", health)
+    return app
+
+
+async def create_service(max_batch: int = 64, max_delay: float = 0.005) -> web.Application:
+    """加载模板并创建服务"""
+    recognizer = NCCCaptchaRecognizer()
+    await recognizer.async_warm_up()
+    batcher = BatchingRecognizer(recognizer, max_batch, max_delay)
+    return create_app(batcher, recognizer)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--host", default="0.0.0.0")
+    arg_parser.add_argument("--port", type=int, default=8090)
+    arg_parser.add_argument("--max-batch", type=int, default=64, help="每批最多的图片数")
+    arg_parser.add_argument("--max-delay-ms", type=float, default=5.0, help="凑批的最长等待时间（毫秒）")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(
+        create_service(args.max_batch, args.max_delay_ms / 1000),
+        host=args.host,
+        port=args.port,
+        access_log=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""导出账单历史（不依赖 Home Assistant）
+
+读取一个或多个账单历史库（配置目录 .storage 下的 cdwater_history_<用户号>.db），
+按账期从旧到新逐条输出 CSV 或 JSON Lines，多个历史库写入同一个文件。
+记录边读边写，内存占用与账号数和年数无关。
+
+用法:
+    python -m tools.export /config/.storage/cdwater_history_*.db --out bills.csv
+    python -m tools.export history.db --format jsonl --start 2023-01-01 --end 2023-12-31
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date
+
+from custom_components.cdwater.export import (
+    EXPORT_FORMATS,
+    FORMAT_CSV,
+    export_history,
+    write_history,
+)
+from custom_components.cdwater.history import BillHistoryStore
+from custom_components.cdwater.records import RECORD_TYPES
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("databases", nargs="+", help="账单历史库文件")
+    arg_parser.add_argument("--out", default="-", help="输出文件，默认标准输出")
+    arg_parser.add_argument("--format", choices=EXPORT_FORMATS, default=FORMAT_CSV)
+    arg_parser.add_argument("--start", type=date.fromisoformat, default=None, help="起始账期日期（包含）")
+    arg_parser.add_argument("--end", type=date.fromisoformat, default=None, help="截止账期日期（包含）")
+    arg_parser.add_argument(
+        "--type", dest="keys", action="append", choices=list(RECORD_TYPES), help="只导出指定的数据，可重复"
+    )
+    args = arg_parser.parse_args()
+
+    missing = [path for path in args.databases if not os.path.exists(path)]
+    if missing:
+        arg_parser.error(f"历史库不存在: {', '.join(missing)}")
+
+    # 按需打开，每个历史库导出完立即关闭
+    def stores():
+        for path in args.databases:
+            store = BillHistoryStore(path)
+            try:
+                yield store
+            finally:
+                store.close()
+
+    if args.out == "-":
+        totals = {}
+        for index, store in enumerate(stores()):
+            counts = write_history(
+                store, sys.stdout, args.format, args.keys, args.start, args.end, header=index == 0
+            )
+            for key, count in counts.items():
+                totals[key] = totals.get(key, 0) + count
+        result = {"records": totals}
+    else:
+        result = export_history(
+            stores(), args.out, args.format, args.keys, args.start, args.end
+        )
+
+    print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""本地模拟的成都自来水查询网站
+
+模仿 waterbill.html、record_*.html（验证码图片）和 getdbsign_*.html
+（``1w|f<html>`` 格式的查询结果）三个接口，可以离线驱动 CdwaterClient。
+验证码由模板目录中的字符图片拼成，答案保存在会话中；可以配置延迟、
+HTTP 错误率和验证码拒绝率。
+
+用法:
+    python -m tools.fake_server --port 8080 --accounts 123456789 987654321
+
+客户端使用 CdwaterClient(base_url="http://localhost:8080")。
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from PIL import Image
+
+from tools import COMPONENT_DIR
+from tools.bench_parser import build_response
+
+TEMPLATES_DIR = os.path.join(COMPONENT_DIR, "templates")
+SESSION_COOKIE = "ASP.NET_SessionId"
+
+CAPTCHA_SIZE = (80, 32)
+
+
+@dataclass
+class FakeServerConfig:
+    """模拟服务器的行为配置"""
+
+    # 每个请求的延迟范围（秒）
+    latency: Tuple[float, float] = (0.0, 0.0)
+    # 任一请求返回 HTTP 500 的概率
+    error_rate: float = 0.0
+    # 验证码正确时仍然返回验证码错误的概率
+    reject_rate: float = 0.0
+    # 每个账号的账单年数
+    years: int = 2
+    seed: Optional[int] = None
+
+
+def build_captcha_corpus(
+    size: int = 200, seed: Optional[int] = None, templates_dir: str = TEMPLATES_DIR
+) -> List[Tuple[bytes, str]]:
+    """用模板字符拼出验证码图片
+
+    Returns:
+        (PNG 数据, 答案) 列表
+    """
+    rng = random.Random(seed)
+    templates: Dict[str, List[Image.Image]] = {}
+    for filename in sorted(os.listdir(templates_dir)):
+        if not filename.endswith(".png"):
+            continue
+        char_name = filename.split("_")[0]
+        with Image.open(os.path.join(templates_dir, filename)) as img:
+            # 模板是黑底白字，验证码是白底黑字
+            glyph = Image.eval(img.convert("L"), lambda value: 255 - value)
+        templates.setdefault(char_name, []).append(glyph)
+
+    chars = sorted(templates)
+    width, height = CAPTCHA_SIZE
+    half = width // 2
+    corpus = []
+    for _ in range(size):
+        canvas = Image.new("L", CAPTCHA_SIZE, 255)
+        answer = ""
+        for index in range(2):
+            char_name = rng.choice(chars)
+            glyph = rng.choice(templates[char_name])
+            x = index * half + rng.randint(0, max(0, half - glyph.width))
+            y = rng.randint(0, max(0, height - glyph.height))
+            canvas.paste(glyph, (x, y))
+            answer += char_name
+
+        buffer = io.BytesIO()
+        canvas.save(buffer, "PNG")
+        corpus.append((buffer.getvalue(), answer))
+    return corpus
+
+
+class FakeCdwaterServer:
+    """模拟网站的 aiohttp 应用"""
+
+    def __init__(
+        self,
+        accounts: Iterable[str],
+        config: Optional[FakeServerConfig] = None,
+        corpus: Optional[List[Tuple[bytes, str]]] = None,
+    ):
+        """初始化
+
+        Args:
+            accounts: 有效的用户号
+            config: 行为配置
+            corpus: 验证码图片和答案，不提供时从模板生成
+        """
+        self.config = config or FakeServerConfig()
+        self._rng = random.Random(self.config.seed)
+        self._corpus = corpus or build_captcha_corpus(seed=self.config.seed)
+        self._responses = {
+            user_id: build_response(self.config.years, seed=index, user_id=user_id)
+            for index, user_id in enumerate(accounts)
+        }
+        # 会话 ID -> 当前验证码答案
+        self._sessions: Dict[str, Optional[str]] = {}
+        self.requests: Dict[str, int] = {}
+
+    def create_app(self) -> web.Application:
+        """创建 aiohttp 应用"""
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/htm/waterbill.html", self._waterbill)
+        app.router.add_get(r"/record_{random_value}.html", self._captcha)
+        app.router.add_get(r"/htm/getdbsign_{random_value}.html", self._query)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        """统一处理延迟和随机错误"""
+        name = handler.__name__.lstrip("_")
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+        low, high = self.config.latency
+        if high > 0:
+            await asyncio.sleep(self._rng.uniform(low, high))
+        if self._rng.random() < self.config.error_rate:
+            raise web.HTTPInternalServerError()
+        return await handler(request)
+
+    async def _waterbill(self, request: web.Request) -> web.Response:
+        """查询页面：建立会话"""
+        session_id = uuid.uuid4().hex
+        self._sessions[session_id] = None
+        response = web.Response(
+            text="<html><body>水费查询</body></html>", content_type="text/html"
+        )
+        response.set_cookie(SESSION_COOKIE, session_id)
+        return response
+
+    async def _captcha(self, request: web.Request) -> web.Response:
+        """验证码图片：把答案记到会话中"""
+        session_id = request.cookies.get(SESSION_COOKIE)
+        image, answer = self._rng.choice(self._corpus)
+        if session_id in self._sessions:
+            self._sessions[session_id] = answer
+        return web.Response(body=image, content_type="image/png")
+
+    async def _query(self, request: web.Request) -> web.Response:
+        """查询接口"""
+        session_id = request.cookies.get(SESSION_COOKIE)
+        if session_id not in self._sessions:
+            return self._text("0w|f会话已过期，请刷新页面")
+
+        # 验证码只能使用一次
+        answer = self._sessions.pop(session_id)
+        captcha = request.query.get("yzm", "")
+        if answer is None or captcha != answer or self._rng.random() < self.config.reject_rate:
+            return self._text("0w|f验证码错误")
+
+        response = self._responses.get(request.query.get("kh", ""))
+        if response is None:
+            return self._text("0w|f用户号不存在")
+        return self._text(response)
+
+    @staticmethod
+    def _text(text: str) -> web.Response:
+        return web.Response(text=text, content_type="text/plain")
+
+
+async def start_server(
+    server: FakeCdwaterServer, host: str = "localhost", port: int = 0
+) -> Tuple[web.AppRunner, str]:
+    """启动服务器
+
+    Returns:
+        (runner, 基础地址)，结束时调用 runner.cleanup()
+    """
+    runner = web.AppRunner(server.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--host", default="localhost")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--accounts", nargs="+", default=["123456789"], help="有效用户号")
+    arg_parser.add_argument("--years", type=int, default=2, help="每个账号的账单年数")
+    arg_parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=("MIN", "MAX"), help="每个请求的延迟范围（秒）")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="HTTP 500 概率")
+    arg_parser.add_argument("--reject-rate", type=float, default=0.0, help="验证码拒绝概率")
+    arg_parser.add_argument("--seed", type=int, default=None)
+    args = arg_parser.parse_args()
+
+    config = FakeServerConfig(
+        latency=tuple(args.latency),
+        error_rate=args.error_rate,
+        reject_rate=args.reject_rate,
+        years=args.years,
+        seed=args.seed,
+    )
+    server = FakeCdwaterServer(args.accounts, config)
+    print(f"模拟服务器: http://{args.host}:{args.port}")
+    web.run_app(server.create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""端到端压力测试
+
+启动本地模拟服务器（或使用 --url 指定的服务器），用多个并发客户端反复
+查询多个账号，统计吞吐量、耗时分位数和每次成功需要的尝试次数。
+
+用法:
+    python -m tools.load_test --accounts 20 --queries 200 --concurrency 10
+    python -m tools.load_test --latency 0.05 0.2 --error-rate 0.05 --reject-rate 0.2
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from tools.fake_server import FakeCdwaterServer, FakeServerConfig, start_server
+from custom_components.cdwater.captcha import CaptchaRecognizer
+from custom_components.cdwater.client import CdwaterClient
+from custom_components.cdwater.exceptions import CdwaterError
+from custom_components.cdwater.metrics import FetchTimeline
+from custom_components.cdwater.retry import without_backoff
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """已排序样本的分位数（最近秩）"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def run_load(
+    base_url: str,
+    accounts: List[str],
+    queries: int,
+    concurrency: int,
+    max_retries: int = 3,
+    share_connector: bool = True,
+    backoff: bool = False,
+) -> Dict:
+    """并发执行 queries 次查询并汇总结果"""
+    recognizer = CaptchaRecognizer()
+    await recognizer.async_warm_up()
+
+    # 默认不做退避等待，压测关心的是客户端本身的开销
+    policies = None if backoff else without_backoff()
+
+    connector = aiohttp.TCPConnector(limit=concurrency) if share_connector else None
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    attempts_per_success: List[int] = []
+    errors: Counter = Counter()
+
+    async def one_query(index: int):
+        user_id = accounts[index % len(accounts)]
+        timeline = FetchTimeline()
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with CdwaterClient(
+                    recognizer,
+                    max_retries=max_retries,
+                    retry_policies=policies,
+                    connector=connector,
+                    base_url=base_url,
+                ) as client:
+                    await client.get_water_bill_data(user_id, timeline)
+            except CdwaterError as err:
+                errors[type(err).__name__] += 1
+                return
+            latencies.append(time.perf_counter() - start)
+            attempts_per_success.append(timeline.attempts)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one_query(index) for index in range(queries)))
+    finally:
+        if connector is not None:
+            await connector.close()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    successes = len(latencies)
+    return {
+        "queries": queries,
+        "successes": successes,
+        "errors": dict(errors),
+        "elapsed": elapsed,
+        "throughput": successes / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "attempts_per_success": (
+            sum(attempts_per_success) / successes if successes else None
+        ),
+    }
+
+
+def print_report(report: Dict, server: Optional[FakeCdwaterServer] = None):
+    """输出压测结果"""
+    print(f"查询 {report['queries']} 次，成功 {report['successes']} 次，耗时 {report['elapsed']:.2f} 秒")
+    print(f"吞吐量: {report['throughput']:.1f} 次成功/秒")
+    print(
+        f"成功查询耗时: p50 {report['p50'] * 1000:.1f} ms, "
+        f"p95 {report['p95'] * 1000:.1f} ms, p99 {report['p99'] * 1000:.1f} ms"
+    )
+    if report["attempts_per_success"] is not None:
+        print(f"每次成功的尝试次数: {report['attempts_per_success']:.2f}")
+    if report["errors"]:
+        print(f"失败: {report['errors']}")
+    if server is not None:
+        print(f"服务器请求数: {server.requests}")
+
+
+async def async_main(args):
+    accounts = [str(100000000 + index) for index in range(args.accounts)]
+
+    runner = None
+    server = None
+    base_url = args.url
+    if base_url is None:
+        config = FakeServerConfig(
+            latency=tuple(args.latency),
+            error_rate=args.error_rate,
+            reject_rate=args.reject_rate,
+            years=args.years,
+            seed=args.seed,
+        )
+        server = FakeCdwaterServer(accounts, config)
+        runner, base_url = await start_server(server)
+
+    try:
+        report = await run_load(
+            base_url,
+            accounts,
+            args.queries,
+            args.concurrency,
+            max_retries=args.max_retries,
+            share_connector=not args.no_shared_connector,
+            backoff=args.backoff,
+        )
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+    print_report(report, server)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--url", default=None, help="已运行的服务器地址，不提供时启动内置模拟服务器")
+    arg_parser.add_argument("--accounts", type=int, default=10, help="账号数量")
+    arg_parser.add_argument("--queries", type=int, default=100, help="查询总次数")
+    arg_parser.add_argument("--concurrency", type=int, default=10, help="并发客户端数")
+    arg_parser.add_argument("--max-retries", type=int, default=3, help="每次查询的最大尝试次数")
+    arg_parser.add_argument("--years", type=int, default=2, help="每个账号的账单年数")
+    arg_parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=("MIN", "MAX"), help="模拟服务器的请求延迟范围（秒）")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务器的 HTTP 500 概率")
+    arg_parser.add_argument("--reject-rate", type=float, default=0.0, help="模拟服务器的验证码拒绝概率")
+    arg_parser.add_argument("--seed", type=int, default=None)
+    arg_parser.add_argument("--backoff", action="store_true", help="按默认策略退避等待（默认立即重试）")
+    arg_parser.add_argument("--no-shared-connector", action="store_true", help="每个客户端使用自己的连接池")
+    arg_parser.add_argument("--verbose", action="store_true", help="输出客户端日志")
+    args = arg_parser.parse_args()
+
+    # 重试过程的日志会淹没报告，默认不输出
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    asyncio.run(async_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""录制与回放查询交互
+
+record 子命令用真实（或模拟）网站查询一次并把交互保存为录制文件；
+replay 子命令按录制顺序回放，不访问网络，重复运行客户端的识别、重试和
+解析流程并输出各阶段耗时。
+
+用法:
+    python -m tools.replay record --user-id 123456789 --out query.json.gz
+    python -m tools.replay replay query.json.gz --repeat 20
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+from custom_components.cdwater.captcha import CaptchaRecognizer
+from custom_components.cdwater.cassette import Cassette, ReplayTransport, KIND_QUERY
+from custom_components.cdwater.client import BASE_URL, CdwaterClient
+from custom_components.cdwater.exceptions import CdwaterError
+from custom_components.cdwater.metrics import FetchMetrics, STAGES
+from custom_components.cdwater.retry import without_backoff
+
+
+async def record(args):
+    recognizer = CaptchaRecognizer()
+    cassette = Cassette()
+    try:
+        async with CdwaterClient(
+            recognizer, max_retries=args.max_retries, base_url=args.url, cassette=cassette
+        ) as client:
+            data = await client.get_water_bill_data(args.user_id)
+        print(f"查询成功，水费账单 {len(data['water_bills'])} 条")
+    except CdwaterError as err:
+        print(f"查询失败: {err}（失败的交互同样会被保存）")
+
+    cassette.save(args.out)
+    print(f"已录制 {len(cassette.exchanges)} 次交互到 {args.out}")
+
+
+def _recorded_user_id(cassette: Cassette) -> str:
+    for exchange in cassette.exchanges:
+        if exchange.kind == KIND_QUERY and exchange.params:
+            return exchange.params.get("kh", "")
+    raise SystemExit("录制文件中没有查询请求，请用 --user-id 指定用户号")
+
+
+async def replay(args):
+    cassette = Cassette.load(args.cassette)
+    user_id = args.user_id or _recorded_user_id(cassette)
+    recognizer = CaptchaRecognizer()
+    await recognizer.async_warm_up()
+
+    metrics = FetchMetrics(window=args.repeat)
+    outcomes = {}
+    for _ in range(args.repeat):
+        timeline = metrics.start_timeline()
+        outcome = "ok"
+        try:
+            async with CdwaterClient(
+                recognizer,
+                max_retries=args.max_retries,
+                # 回放时不做退避等待
+                retry_policies=without_backoff(),
+                transport=ReplayTransport(cassette),
+            ) as client:
+                await client.get_water_bill_data(user_id, timeline)
+        except CdwaterError as err:
+            outcome = type(err).__name__
+        timeline.finish(outcome)
+        metrics.record(timeline)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    summary = metrics.as_dict()
+    print(f"回放 {args.repeat} 次: {outcomes}")
+    print(f"总耗时: {json.dumps(summary['total'], ensure_ascii=False)}")
+    for stage in STAGES:
+        stage_summary = summary["stages"][stage]
+        if stage_summary["count"]:
+            print(f"  {stage:<17} p50 {stage_summary['p50'] * 1000:8.2f} ms  p95 {stage_summary['p95'] * 1000:8.2f} ms")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="查询一次并录制交互")
+    record_parser.add_argument("--user-id", required=True, help="用户号")
+    record_parser.add_argument("--out", required=True, help="录制文件路径（.json.gz）")
+    record_parser.add_argument("--url", default=BASE_URL, help="网站地址")
+    record_parser.add_argument("--max-retries", type=int, default=3)
+
+    replay_parser = subparsers.add_parser("replay", help="回放录制文件")
+    replay_parser.add_argument("cassette", help="录制文件路径")
+    replay_parser.add_argument("--user-id", default=None, help="用户号，默认取录制中的用户号")
+    replay_parser.add_argument("--repeat", type=int, default=10, help="回放次数")
+    replay_parser.add_argument("--max-retries", type=int, default=3)
+
+    arg_parser.add_argument("--verbose", action="store_true", help="输出客户端日志")
+    args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    asyncio.run(record(args) if args.command == "record" else replay(args))
+
+
+if __name__ == "__main__":
+    main()